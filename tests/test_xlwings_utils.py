@@ -3,6 +3,9 @@ import sys
 from pathlib import Path
 import io
 import functools
+import json
+import time
+import zipfile
 
 if __name__ == "__main__":  # to make the tests run without the pytest cli
     import os, sys  # three lines to use the local package and chdir
@@ -175,6 +178,147 @@ def test_raise():
         this_block[1, 7] = 1
 
 
+def test_block_builder():
+    builder = xwu.block_builder(number_of_columns=2)
+    builder.append_row([1, 2])
+    builder.append_row([])
+    builder.extend_rows([[3, None, 5], 6])
+    bl = builder.build()
+    assert bl.number_of_rows == 4
+    assert bl.number_of_columns == 3
+    assert bl.value == [[1, 2, None], [None, None, None], [3, None, 5], [6, None, None]]
+    bl = builder.build()
+    assert bl.number_of_rows == 1
+    assert bl.number_of_columns == 2
+    assert bl.dict == {}
+    builder.append_row(x * 2 for x in range(3))
+    builder.extend_rows([range(2), "abc", (x for x in [None, 7])])
+    assert builder.build().value == [[0, 2, 4], [0, 1, None], ["abc", None, None], [None, 7, None]]
+
+
+def test_regions():
+    bl = xwu.block.from_value(
+        [
+            ["Project", "Factory1", None, None],
+            [None, None, None, None],
+            ["Parts", "Width", None, "x"],
+            ["A", 10, None, None],
+            [None, 11, None, None],
+            [None, None, 12, None],
+        ]
+    )
+    regions = bl.regions()
+    assert [(row, column) for row, column, region in regions] == [(1, 1), (3, 1)]
+    assert regions[0][2].value == [["Project", "Factory1"]]
+    assert regions[1][2].value == [["Parts", "Width", None, "x"], ["A", 10, None, None], [None, 11, None, None], [None, None, 12, None]]
+
+    row, column, region = bl.current_region(5, 2)
+    assert (row, column) == (3, 1)
+    assert region == regions[1][2]
+    row, column, region = bl.current_region(2, 4)
+    assert (row, column) == (2, 4)
+    assert region.dict == {}
+    assert xwu.block(number_of_rows=3, number_of_columns=3).regions() == []
+
+    # a cell inside the bounding rectangle of another region (without touching it) belongs to that region
+    bl = xwu.block.from_value([[1, None, 1], [None, None, 1], [1, None, 1], [1, 1, 1], [None, None, None], [1, None, None]])
+    assert [(row, column, region.number_of_rows, region.number_of_columns) for row, column, region in bl.regions()] == [(1, 1, 4, 3), (6, 1, 1, 1)]
+    assert bl.current_region(1, 1)[:2] == (1, 1)
+    assert bl.current_region(1, 1)[2] == bl.regions()[0][2]
+    assert bl.current_region(6, 1)[2].value == [[1]]
+
+    bl = xwu.block.from_value([[1, 2], [None, None]] * 1000)
+    regions = bl.regions()
+    assert len(regions) == 1000
+    assert regions[-1][:2] == (1999, 1)
+    assert bl.current_region(1999, 2)[:2] == (1999, 1)
+
+
+def test_intern():
+    value = [["A" + "B", 1], ["".join(["A", "B"]), 1.0], ["C", True], [None, 1]]
+    assert value[0][0] is not value[1][0]
+    bl = xwu.block.from_value(value, intern=True)
+    assert bl.interned
+    assert bl[1, 1] is bl[2, 1]
+    assert bl.categories(1) == ["AB", "C"]
+    assert bl.codes(1) == [0, 0, 1, None]
+    assert [type(category) for category in bl.categories(2)] == [int, float, bool]
+    assert bl.codes(2) == [0, 1, 2, 0]
+    bl[4, 1] = "".join(["C"])
+    assert bl[4, 1] is bl[3, 1]
+    assert bl.transposed().categories(1) == ["AB", 1]
+    assert not xwu.block.from_value(value).interned
+    with pytest.raises(ValueError):
+        xwu.block.from_value(value).categories(1)
+    bl = xwu.block.from_value([["A", [1]], ["A", 2]], intern=True)
+    assert bl.codes(2) == [None, 0]
+    assert bl.categories(2) == [2]
+
+
+def test_arithmetic():
+    bl1 = xwu.block.from_value([[1, 2, None], [4, None, 6]])
+    bl2 = xwu.block.from_value([[10, None, None], [None, 50, 60]])
+    assert (bl1 + 1).value == [[2, 3, None], [5, None, 7]]
+    assert (1 - bl1).value == [[0, -1, None], [-3, None, -5]]
+    assert (bl1 * 2).value == [[2, 4, None], [8, None, 12]]
+    assert (12 / bl1).value == [[12, 6, None], [3, None, 2]]
+    assert (bl1 + bl2).value == [[11, 2, None], [4, 50, 66]]
+    assert (bl1 - bl2).value == [[-9, 2, None], [4, -50, -54]]
+    assert (bl1 * bl2).value == [[10, None, None], [None, None, 360]]
+    assert (bl2 / bl1).value == [[10, None, None], [None, None, 10]]
+    with pytest.raises(ValueError):
+        bl1 + bl1.transposed()
+    bl3 = xwu.block.from_value([["qty", "ok"], [2, True], [3, None]])
+    assert (bl3 * 2).value == [["qty", "ok"], [4, True], [6, None]]
+    assert (1 + bl3).value == [["qty", "ok"], [3, True], [4, None]]
+    assert (bl3 + bl3).value == [["qty", "ok"], [4, True], [6, None]]
+    assert (bl3 * bl3).value == [["qty", "ok"], [4, True], [9, None]]
+    bl4 = xwu.block.from_value([[None, None], [3, 1], [None, 2]])
+    assert (bl3 + bl4).value == [["qty", "ok"], [5, True], [3, 2]]
+    assert (bl4 + bl3).value == [["qty", "ok"], [5, True], [3, 2]]
+    assert (bl3 * bl4).value == [["qty", "ok"], [6, True], [None, None]]
+    assert (bl4 / bl3).value == [["qty", "ok"], [1.5, True], [None, None]]
+    assert (bl4 - bl3).value == [["qty", "ok"], [1, True], [-3, 2]]
+
+
+def test_reductions():
+    bl = xwu.block.from_value([["Part", "Width", "Height"], ["A", 10, 5], ["B", 11, True], ["C", 12, 3.5]])
+    assert bl.sum() == 41.5
+    assert bl.sum(column=2) == 33
+    assert bl.sum(row=2) == 15
+    assert bl.sum(row=1) == 0
+    assert bl.min(column=2) == 10
+    assert bl.max() == 12
+    assert bl.mean(column=3) == 4.25
+    with pytest.raises(ValueError):
+        bl.mean(column=1)
+    with pytest.raises(ValueError):
+        bl.sum(column=4)
+    assert bl.sum(axis="column") == [0, 33, 8.5]
+    assert bl.sum(axis="row") == [0, 15, 11, 15.5]
+    assert bl.min(axis="column") == [None, 10, 3.5]
+    assert bl.max(axis="row") == [None, 10, 11, 12]
+    assert bl.mean(axis="column") == [None, 11, 4.25]
+    with pytest.raises(ValueError):
+        bl.sum(axis="diagonal")
+    with pytest.raises(ValueError):
+        bl.sum(row=1, axis="column")
+
+
+def test_diff():
+    bl1 = xwu.block.from_value([[1, 2, 3], [4, 5, 6]])
+    bl2 = xwu.block.from_value([[1, 20, None], [4, 5, 6], [None, 8, None]])
+    diff = bl1.diff(bl2)
+    assert diff == dict(number_of_rows=3, number_of_columns=3, added=[[3, 2, 8]], removed=[[1, 3]], changed=[[1, 2, 20]])
+    assert bl1.diff(bl1) == dict(number_of_rows=2, number_of_columns=3, added=[], removed=[], changed=[])
+    bl1.apply_diff(json.loads(json.dumps(diff)))
+    assert bl1 == bl2
+    assert bl1 != bl2.reshape(number_of_columns=4)
+    bl3 = xwu.block.from_value([[1], [None]])
+    bl2.apply_diff(bl2.diff(bl3))
+    assert bl2 == bl3
+
+
 def test_lookup():
     bl = xwu.block.from_value([[1, "One", "Un"], [2, "Two", "Deux"], [3, "Three", "Trois"]])
     assert bl.lookup(1) == "One"
@@ -219,6 +363,107 @@ def test_hlookup():
     assert bl.lookup_column(3) == 3
 
 
+def test_encode_decode(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    contents = bytes(range(256)) * 100
+    Path("data.bin").write_bytes(contents)
+    bl = xwu.block.encode_file("data.bin")
+    assert bl.number_of_columns == 1
+    assert bl[1, 1] == "<file=data.bin>"
+    assert [len(bl[row, 1]) for row in range(2, bl.number_of_rows)] == [5000] * 6 + [4136]
+    assert bl[bl.number_of_rows, 1] == "</file>"
+    Path("data.bin").unlink()
+    assert bl.decode_to_files() == 1
+    assert Path("data.bin").read_bytes() == contents
+
+    Path("text.txt").write_text("abc")
+    bl = xwu.block.from_value([[row[0], None] for row in bl.value])
+    bl[1, 2] = "<file=text.txt>"
+    bl[2, 2] = "YW"  # chunks do not have to be a multiple of 4 characters
+    bl[3, 2] = "Jj"
+    bl[4, 2] = "</file>"
+    assert bl.decode_to_files(directory="out") == 2
+    assert Path("out/data.bin").read_bytes() == contents
+    assert Path("out/text.txt").read_text() == "abc"
+    assert bl.decode_to_files(directory="out2", pattern="*.txt") == 1
+    assert os.listdir("out2") == ["text.txt"]
+    bl[4, 2] = None
+    with pytest.raises(ValueError):
+        bl.decode_to_files(directory="out4")
+    assert os.listdir("out4") == ["data.bin"]  # the truncated text.txt is not written
+
+    Path("x").mkdir()
+    Path("x/data.txt").write_text("absolute")
+    bl = xwu.block.encode_file(str(tmp_path / "x" / "data.txt"))
+    assert bl.decode_to_files(directory="out3") == 1
+    assert os.listdir("out3") == ["data.txt"]
+    assert Path("out3/data.txt").read_text() == "absolute"
+    bl[1, 1] = "<file=../escaped.txt>"
+    with pytest.raises(ValueError):
+        bl.decode_to_files(directory="out3")
+    assert not Path("escaped.txt").exists()
+
+
+@pytest.mark.parametrize("compression", ["deflate", "lzma"])
+def test_encode_decode_compressed(tmp_path, monkeypatch, compression):
+    monkeypatch.chdir(tmp_path)
+    contents = "\n".join(f"line {i};value {i % 7}" for i in range(100000)).encode()
+    Path("data.csv").write_bytes(contents)
+    bl = xwu.block.encode_file("data.csv", compression=compression)
+    assert bl[1, 1].startswith(f"<file=data.csv;z={compression};sha256=")
+    assert bl.number_of_rows < len(xwu.block.encode_file("data.csv").dict) / 5
+    assert bl.decode_to_files(directory="out") == 1
+    assert Path("out/data.csv").read_bytes() == contents
+
+    bl[1, 1] = bl[1, 1][:-2] + ("0>" if bl[1, 1][-2] != "0" else "1>")
+    with pytest.raises(ValueError):
+        bl.decode_to_files(directory="out")
+    assert os.listdir("out") == ["data.csv"]
+    assert Path("out/data.csv").read_bytes() == contents  # not replaced by the corrupt file
+    with pytest.raises(ValueError):
+        bl.decode_to_files(directory="bad")
+    assert not Path("bad/data.csv").exists()
+    with pytest.raises(ValueError):
+        xwu.block.encode_file("data.csv", compression="zip")
+
+
+def test_encode_decode_wide(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    contents = bytes(range(256)) * 100
+    Path("data.bin").write_bytes(contents)
+    bl = xwu.block.encode_file("data.bin", number_of_columns=4, chunk_size=1000)
+    assert bl[1, 1] == "<file=data.bin;columns=4>"
+    assert bl.number_of_columns == 4
+    assert bl.number_of_rows == 1 + 9 + 1
+    assert bl[bl.number_of_rows, 1] == "</file>"
+    assert bl.decode_to_files(directory="out") == 1
+    assert Path("out/data.bin").read_bytes() == contents
+
+    bl = xwu.block.encode_file("data.bin", number_of_columns=3, compression="deflate", chunk_size=32764)
+    assert bl.decode_to_files(directory="out2") == 1
+    assert Path("out2/data.bin").read_bytes() == contents
+    with pytest.raises(ValueError):
+        xwu.block.encode_file("data.bin", chunk_size=32768)
+    with pytest.raises(ValueError):
+        xwu.block.encode_file("data.bin", chunk_size=5001)
+
+
+def test_encode_decode_folder(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for name in ("project/main.py", "project/data/a.csv", "project/data/b.csv", "project/data/notes.txt"):
+        Path(name).parent.mkdir(parents=True, exist_ok=True)
+        Path(name).write_text(f"contents of {name}\n" * 100)
+    bl = xwu.block.encode_folder("project", pattern="*.csv")
+    assert bl[1, 1] == "<file=project.zip;archive=zip>"
+    assert bl.decode_to_files(directory="out") == 2
+    assert sorted(str(path.relative_to("out").as_posix()) for path in Path("out").rglob("*") if path.is_file()) == ["project/data/a.csv", "project/data/b.csv"]
+    assert Path("out/project/data/a.csv").read_text() == Path("project/data/a.csv").read_text()
+
+    bl = xwu.block.encode_folder("project", number_of_columns=2, chunk_size=100)
+    assert bl.decode_to_files(directory="out2") == 4
+    assert Path("out2/project/main.py").read_text() == Path("project/main.py").read_text()
+
+
 def test_capture(capsys):
     print("abc")
     print("def")
@@ -272,6 +517,653 @@ def test_capture(capsys):
     # include_print is not testable with pytest
 
 
+def test_capture_ring_buffer(capsys):
+    capture = xwu.Capture(enabled=False, max_lines=3)
+    capture.clear()
+    capture.new_lines()
+    mark = capture.mark
+    with capture:
+        for i in range(5):
+            print(f"line {i}")
+        print("partial", end="")
+    assert capture.value_keep == [["line 2"], ["line 3"], ["line 4"], ["partial"]]
+    assert capture.value_since(mark) == [["line 2"], ["line 3"], ["line 4"]]
+    assert capture.new_lines() == ["line 2", "line 3", "line 4"]
+    with capture:
+        print(" done", flush=True)
+    assert capture.new_lines() == ["partial done"]
+    assert capture.new_lines() == []
+    assert capture.value_since(capture.mark - 1) == [["partial done"]]
+
+    capture(max_lines=None, max_characters=10)
+    assert capture.str_keep == ""  # "partial done\n" does not fit in 10 characters
+    with capture:
+        print("abcd")
+        print("efgh")
+    assert capture.str == "abcd\nefgh\n"
+    capture(max_characters=None)
+
+
+def test_capture_context(capsys):
+    import asyncio
+    import concurrent.futures
+
+    capture = xwu.Capture(enabled=False)
+    capture.clear()
+    assert not capture.enabled
+
+    def work(i):
+        with capture.context():
+            print(f"start {i}")
+            print(f"end {i}")
+
+    with capture:
+        assert capture.enabled
+        with concurrent.futures.ThreadPoolExecutor(4) as executor:
+            list(executor.map(work, range(20)))
+    lines = capture.value
+    assert len(lines) == 40
+    for i in range(0, 40, 2):  # the output of each worker is contiguous
+        assert lines[i][0].replace("start", "end") == lines[i + 1][0]
+
+    async def task(i):
+        with capture.context():
+            print(f"start {i}")
+            await asyncio.sleep(0)
+            print(f"end {i}")
+
+    async def main():
+        await asyncio.gather(*(task(i) for i in range(3)))
+
+    with capture:
+        with capture.context():
+            print("outer")
+            asyncio.run(main())
+    assert capture.value == [["outer"], ["start 0"], ["end 0"], ["start 1"], ["end 1"], ["start 2"], ["end 2"]]
+
+
+def test_capture_handler():
+    import logging
+
+    handler = xwu.CaptureHandler(level=logging.INFO, max_records=3)
+    logger = logging.getLogger("test_capture_handler")
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(handler)
+    try:
+        logger.debug("not stored")
+        for i in range(4):
+            logger.info("message %d", i)
+        logger.warning("warning")
+    finally:
+        logger.removeHandler(handler)
+    assert [record.getMessage() for record in handler.records] == ["message 2", "message 3", "warning"]
+    assert handler.value_keep == [["message 2"], ["message 3"], ["warning"]]
+    bl = handler.block
+    assert bl.value[0] == ["timestamp", "level", "logger", "message"]
+    assert [row[1:] for row in bl.value[1:]] == [
+        ["INFO", "test_capture_handler", "message 2"],
+        ["INFO", "test_capture_handler", "message 3"],
+        ["WARNING", "test_capture_handler", "warning"],
+    ]
+    handler.setFormatter(logging.Formatter("%(levelname)s:%(message)s"))
+    assert handler.str == "INFO:message 2\nINFO:message 3\nWARNING:warning\n"
+    assert handler.value == []
+
+    handler = xwu.CaptureHandler()
+    logger.addHandler(handler)
+    try:
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            logger.exception("failed")
+    finally:
+        logger.removeHandler(handler)
+    (record,) = handler.records
+    assert record.exc_info is None
+    assert "ZeroDivisionError" in record.exc_text
+    assert handler.str.startswith("failed\nTraceback")
+
+    capture = xwu.Capture(enabled=False)
+    capture.clear()
+    handler = xwu.CaptureHandler(level=logging.INFO, capture=capture)
+    handler.setFormatter(logging.Formatter("%(levelname)s:%(message)s"))
+    logger.addHandler(handler)
+    try:
+        logger.debug("not stored")
+        logger.info("message")
+    finally:
+        logger.removeHandler(handler)
+    assert handler.records == []
+    assert capture.value == [["INFO:message"]]
+
+
+def test_capture_sink(capsys):
+    class Sheet:
+        def __init__(self):
+            self.cells = {}
+
+        def range(self, cell):
+            sheet = self
+
+            class Range:
+                row, column = cell
+
+                @property
+                def value(self):
+                    return sheet.cells.get((self.row, self.column))
+
+                @value.setter
+                def value(self, value):
+                    for row, (line,) in enumerate(value, self.row):
+                        sheet.cells[row, self.column] = line
+
+            return Range()
+
+    sheet = Sheet()
+    rng = sheet.range((2, 3))
+    rng.sheet = sheet
+    received = []
+    capture = xwu.Capture(enabled=False, sink=received.append, interval=1000)
+    with capture:
+        print("abc")
+        print("def")
+        assert received == []
+    assert received == [[["abc"], ["def"]]]
+    capture(sink=rng, interval=0)
+    with capture:
+        print("ghi")
+        print("jkl")
+        assert sheet.cells == {(2, 3): "ghi", (3, 3): "jkl"}
+        print("mno")
+    assert sheet.cells == {(2, 3): "ghi", (3, 3): "jkl", (4, 3): "mno"}
+    capture.clear()
+    received.clear()
+    capture(sink=received.append, interval=1000)
+    with capture:
+        print("line1")
+        sys.stdout.write("progress 100%")
+    assert received == [[["line1"], ["progress 100%"]]]
+    with capture:
+        print(" done")
+        print("next", end="")
+    with capture:
+        pass
+    assert received == [[["line1"], ["progress 100%"]], [[" done"], ["next"]]]
+    capture.clear()
+    capture(sink=rng, interval=1000)
+    sheet.cells.clear()
+    with capture:
+        print("progress", end="")
+    with capture:
+        print(" done")
+    assert sheet.cells == {(2, 3): "progress done"}
+    capture(sink=None, interval=1)
+    capture.clear()
+
+
+def test_timer(capsys):
+    xwu.timer.reset()
+
+    @xwu.timer(report=False)
+    def inner():
+        time.sleep(0.01)
+
+    @xwu.timer
+    def outer():
+        inner()
+        inner()
+
+    outer()
+    assert "Done outer" in capsys.readouterr().out
+    inner()
+    assert capsys.readouterr().out == ""
+
+    bl = xwu.timer.stats()
+    assert bl.value[0] == ["name", "count", "total", "self", "min", "max", "mean", "p50", "p95", "p99"]
+    assert all(row[0].startswith(f"{__name__}.test_timer.<locals>.") for row in bl.value[1:])
+    stats = {row[0].split(".")[-1]: dict(zip(bl.value[0], row)) for row in bl.value[1:]}
+    assert stats["inner"]["count"] == 3
+    assert stats["outer"]["count"] == 1
+    assert stats["inner"]["total"] >= 0.03
+    assert stats["outer"]["self"] < stats["outer"]["total"] - 0.015
+    for name in ("inner", "outer"):
+        assert stats[name]["min"] <= stats[name]["p50"] <= stats[name]["p99"] <= stats[name]["max"]
+    xwu.timer.reset()
+    assert xwu.timer.stats().value == [["name", "count", "total", "self", "min", "max", "mean", "p50", "p95", "p99"]]
+
+
+def test_trace(tmp_path):
+    @xwu.timer(report=False)
+    def work():
+        with xwu.span("inner"):
+            time.sleep(0.001)
+
+    with xwu.span("not recorded"):
+        pass
+    trace = xwu.Trace(max_events=3)
+    trace.clear()
+    try:
+        with xwu.span("outer"):
+            work()
+        events = [event for event in trace.events if event["ph"] == "X"]
+        assert [event["name"].split(".")[-1] for event in events] == ["inner", "work", "outer"]
+        assert [event["cat"] for event in events] == ["span", "timer", "span"]
+        assert events[0]["dur"] >= 1000
+        assert events[2]["ts"] <= events[1]["ts"] <= events[0]["ts"]
+
+        work()
+        assert len([event for event in trace.events if event["ph"] == "X"]) == 3
+
+        trace.write(tmp_path / "trace.json")
+        assert json.loads((tmp_path / "trace.json").read_text())["traceEvents"] == json.loads(trace.json)["traceEvents"]
+
+        written = {}
+
+        class Cloud:
+            def write(path, contents):
+                written[path] = contents
+
+        trace.write("/trace.json", cloud=Cloud)
+        assert json.loads(written["/trace.json"])["traceEvents"] == json.loads(trace.json)["traceEvents"]
+    finally:
+        xwu.Trace(enabled=False)
+        trace.clear()
+
+
+def test_profile():
+    def slow():
+        time.sleep(0.01)
+
+    @xwu.profile(top=5, memory=True)
+    def work(n):
+        slow()
+        return [str(i) * 10 for i in range(n)]
+
+    assert work.__name__ == "work"
+    assert len(work(10000)) == 10000
+    rows = work.result.value
+    assert rows[0] == ["function", "calls", "total time", "cumulative time"]
+    assert len([row for row in rows[1:6] if row[0]]) == 5
+    assert any(row[0].startswith("slow (") for row in rows[1:6])
+    assert rows[6] == [None, None, None, None]
+    assert rows[7] == ["allocation site", "size", "count", None]
+    assert rows[8][0].startswith("test_xlwings_utils.py:")
+    assert rows[8][1] > 100000
+
+    @xwu.profile
+    def outer():
+        return work(10)
+
+    outer()
+    assert outer.result.value[0] == ["function", "calls", "total time", "cumulative time"]
+    assert len(outer.result.value) <= 21
+    assert any(row[0].startswith("work (") for row in outer.result.value)
+    assert work.result.value == rows  # not profiled separately when called from a profiled function
+
+    import tracemalloc
+
+    big = [bytearray(20_000_000)]
+
+    @xwu.profile(memory=True)
+    def release_and_allocate():
+        big.clear()
+        return [str(i) * 10 for i in range(10000)]
+
+    tracemalloc.start()
+    try:
+        release_and_allocate()
+    finally:
+        tracemalloc.stop()
+    rows = release_and_allocate.result.value
+    allocations = rows[rows.index(["allocation site", "size", "count", None]) + 1 :]
+    assert allocations
+    assert all(row[1] > 0 for row in allocations)
+
+
+def test_memoize(monkeypatch):
+    calls = []
+
+    @xwu.memoize(maxsize=2)
+    def total(bl, factor=1):
+        calls.append(bl)
+        return bl.sum() * factor
+
+    bl = xwu.block.from_value([[1, 2], [3, 4]])
+    assert total(bl) == 10
+    assert total(xwu.block.from_value([[1, 2], [3, 4]])) == 10
+    assert total(bl, factor=2) == 20
+    assert len(calls) == 2
+    assert total.cache_info() == (1, 2, 2, 2)
+    bl[1, 1] = 11
+    assert total(bl) == 20
+    assert total(bl, factor=2) == 40
+    assert total.cache_info().currsize == 2
+    assert total(xwu.block.from_value([[1, 2], [3, 4]])) == 10  # evicted
+    assert len(calls) == 5
+    assert xwu.undecorated(total)(bl) == 20
+    total.cache_clear()
+    assert total.cache_info() == (0, 0, 2, 0)
+    digest = bl._digest()
+    assert bl._digest() is digest  # cached
+    bl.number_of_rows = 1
+    assert bl._digest() != digest
+    bl.number_of_rows = 2
+    assert bl._digest() != digest  # same contents, but the bottom row has been cleared
+
+    now = [0]
+    monkeypatch.setattr(xwu.xlwings_utils.time, "monotonic", lambda: now[0])
+
+    @xwu.memoize(ttl=10)
+    def double(values):
+        calls.append(values)
+        return [[value * 2 for value in row] for row in values]
+
+    calls.clear()
+    assert double([[1, 2]]) == [[2, 4]]
+    now[0] = 9
+    assert double([[1, 2]]) == [[2, 4]]
+    assert len(calls) == 1
+    now[0] = 11
+    assert double([[1, 2]]) == [[2, 4]]
+    assert len(calls) == 2
+    assert double.cache_info() == (1, 2, 128, 1)
+
+    @xwu.memoize
+    def identity(value):
+        return value.value if isinstance(value, xwu.block) else value
+
+    assert identity(xwu.block.from_value([[True]])) == [[True]]
+    assert identity(xwu.block.from_value([[1]])) == [[1]]
+    assert identity(xwu.block.from_value([[1.0]])) == [[1.0]]
+    assert identity([[True]]) == [[True]]
+    assert identity([[1]]) == [[1]]
+    assert identity(True) is True
+    assert identity(1) == 1 and identity(1) is not True
+    assert identity.cache_info() == (1, 7, 128, 7)
+
+
+def make_workbook(path, properties):
+    # minimal workbook with the xlwings Lite properties embedded in the webextension
+    ns = "http://schemas.microsoft.com/office/webextensions/webextension/2010/11"
+    xml_properties = "".join(
+        f'<we:property name="{name}" value="{json.dumps(value).replace("&", "&amp;").replace(chr(34), "&quot;")}"/>' for name, value in properties.items()
+    )
+    xml = f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><we:webextension xmlns:we="{ns}"><we:properties>{xml_properties}</we:properties></we:webextension>'
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("[Content_Types].xml", "<Types/>", compress_type=zipfile.ZIP_DEFLATED)
+        zf.writestr("xl/worksheets/sheet1.xml", "<worksheet>" + "<row/>" * 10000 + "</worksheet>", compress_type=zipfile.ZIP_DEFLATED)
+        zf.writestr("xl/media/image1.png", os.urandom(1000), compress_type=zipfile.ZIP_STORED)
+        zf.writestr("xl/webextensions/webextension1.xml", xml, compress_type=zipfile.ZIP_DEFLATED)
+
+
+def test_cli_replace(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    make_workbook("book.xlsx", {"main.py": "print('old')\r\n", "requirements.txt": "xlwings_utils"})
+    Path("main.py").write_text("print('new')\nprint('line 2')\n")
+    Path("pyproject.toml").write_text("[project]\n")
+    xwu.main(["replace", "-m", "main.py", "-p", "pyproject.toml", "book.xlsx", "new.xlsx"])
+    assert "written new.xlsx" in capsys.readouterr().out
+    assert [path.name for path in tmp_path.iterdir() if path.suffix == ".tmp"] == []
+
+    with zipfile.ZipFile("book.xlsx") as zin, zipfile.ZipFile("new.xlsx") as znew:
+        assert znew.testzip() is None
+        assert znew.namelist() == zin.namelist()
+        for name in ("xl/worksheets/sheet1.xml", "xl/media/image1.png"):
+            assert znew.getinfo(name).compress_size == zin.getinfo(name).compress_size
+            assert znew.getinfo(name).compress_type == zin.getinfo(name).compress_type
+            assert znew.read(name) == zin.read(name)
+
+    xwu.main(["extract", "-m", "main_new.py", "-r", "requirements_new.txt", "-p", "pyproject_new.toml", "new.xlsx"])
+    assert Path("main_new.py").read_text() == "print('new')\nprint('line 2')"
+    assert Path("requirements_new.txt").read_text() == "xlwings_utils"
+    assert Path("pyproject_new.toml").read_text() == "[project]"
+
+    if sys.platform != "win32":
+        umask = os.umask(0o022)
+        try:
+            xwu.main(["replace", "-m", "main.py", "book.xlsx", "new_mode.xlsx"])
+            assert Path("new_mode.xlsx").stat().st_mode & 0o777 == 0o644
+            os.chmod("book.xlsx", 0o664)
+            xwu.main(["replace", "-m", "main.py", "book.xlsx", "*"])  # in place
+            assert Path("book.xlsx").stat().st_mode & 0o777 == 0o664
+        finally:
+            os.umask(umask)
+    xwu.main(["replace", "-m", "main.py", "book.xlsx", "*"])  # in place
+    xwu.main(["extract", "-m", "main_book.py", "book.xlsx"])
+    assert Path("main_book.py").read_text() == "print('new')\nprint('line 2')"
+
+
+def test_embedded_code(tmp_path, capsys):
+    make_workbook(tmp_path / "book.xlsx", {"main.py": "import xlwings as xw\r\n\r\nprint(1)", "requirements.txt": "xlwings_utils"})
+    expected = {"main.py": "import xlwings as xw\n\nprint(1)", "requirements.txt": "xlwings_utils"}
+    assert xwu.embedded_code(tmp_path / "book.xlsx") == expected
+    assert xwu.embedded_code(str(tmp_path / "book.xlsx")) == expected
+    assert xwu.embedded_code((tmp_path / "book.xlsx").read_bytes()) == expected
+
+    with zipfile.ZipFile(tmp_path / "plain.xlsx", "w") as zf:
+        zf.writestr("[Content_Types].xml", "<Types/>")
+    assert xwu.embedded_code(tmp_path / "plain.xlsx") == {}
+
+    xwu.main(["info", str(tmp_path / "book.xlsx")])
+    assert capsys.readouterr().out == "main.py\n   import xlwings as xw\n   \n   print(1)\nrequirements.txt\n   xlwings_utils\ndone\n"
+    xwu.main(["info", str(tmp_path / "plain.xlsx")])
+    assert capsys.readouterr().out.startswith("no action, because xlwings is not embedded in")
+
+
+def test_cli_batch(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    Path("books").mkdir()
+    for i in range(3):
+        make_workbook(f"books/book{i}.xlsx", {"main.py": f"print({i})", "requirements.txt": "xlwings_utils"})
+    with zipfile.ZipFile("books/plain.xlsx", "w") as zf:
+        zf.writestr("[Content_Types].xml", "<Types/>")
+    Path("books/broken.xlsx").write_bytes(b"not a zip file")
+    Path("manifest.txt").write_text("# workbooks\nbooks/plain.xlsx\n\nbooks/broken.xlsx\n")
+    Path("main.py").write_text("print('new')\n")
+
+    assert xwu.main(["batch", "replace", "-m", "main.py", "-o", "out", "-j", "2", "--manifest", "manifest.txt", "books/book*.xlsx"]) == 1
+    summary = json.loads(capsys.readouterr().out)
+    assert (summary["ok"], summary["skipped"], summary["errors"]) == (3, 1, 1)
+    assert [result["workbook"] for result in summary["workbooks"]] == [
+        str(Path("books/book0.xlsx")),
+        str(Path("books/book1.xlsx")),
+        str(Path("books/book2.xlsx")),
+        "books/plain.xlsx",
+        "books/broken.xlsx",
+    ]
+    assert summary["workbooks"][0]["properties"] == ["main.py"]
+    assert summary["workbooks"][4]["status"] == "error"
+    for i in range(3):
+        assert xwu.embedded_code(f"out/book{i}.xlsx")["main.py"] == "print('new')"
+        assert xwu.embedded_code(f"books/book{i}.xlsx")["main.py"] == f"print({i})"
+
+    assert xwu.main(["batch", "extract", "-m", "{stem}_main.py", "-j", "1", "--summary", "summary.json", "books/book*.xlsx"]) == 0
+    assert json.loads(Path("summary.json").read_text())["ok"] == 3
+    assert [Path(f"book{i}_main.py").read_text() for i in range(3)] == ["print(0)", "print(1)", "print(2)"]
+    assert xwu.options[0].__dict__.get("filename") is None  # no global state
+
+    with pytest.raises(SystemExit) as excinfo:
+        xwu.main(["batch", "extract", "-m", "main_extracted.py", "books/book*.xlsx"])
+    assert excinfo.value.code == 1
+    assert "should contain {stem}" in capsys.readouterr().out
+    assert not Path("main_extracted.py").exists()
+
+    Path("other").mkdir()
+    make_workbook("other/book0.xlsx", {"main.py": "print('other')"})
+    with pytest.raises(SystemExit) as excinfo:
+        xwu.main(["batch", "replace", "-m", "main.py", "-o", "out2", "books/book0.xlsx", "other/book0.xlsx"])
+    assert excinfo.value.code == 1
+    assert "would both be written to" in capsys.readouterr().out
+    assert not Path("out2").exists()
+    with pytest.raises(SystemExit):
+        xwu.main(["batch", "extract", "-m", "{stem}_main.py", "books/book0.xlsx", "other/book0.xlsx"])
+    assert "would both be written to" in capsys.readouterr().out
+
+
+def test_cli_watch(tmp_path, monkeypatch, capsys):
+    import threading
+
+    monkeypatch.chdir(tmp_path)
+    make_workbook("book.xlsx", {"main.py": "print(1)", "requirements.txt": "xlwings_utils"})
+    Path("main.py").write_text("print(1)\n")
+    Path("requirements.txt").write_text("xlwings_utils\n")
+
+    stop = threading.Event()
+    thread = threading.Thread(target=xwu.xlwings_utils._watch, args=("book.xlsx", {"main.py": "main.py", "requirements.txt": "requirements.txt"}, 0.01, 0.05, stop))
+    thread.start()
+    try:
+        time.sleep(0.2)
+        assert capsys.readouterr().out == ""  # files are equal to the contents of the workbook
+        Path("main.py").write_text("print(2)\n")
+        for _ in range(200):
+            if xwu.embedded_code("book.xlsx")["main.py"] == "print(2)":
+                break
+            time.sleep(0.01)
+        assert xwu.embedded_code("book.xlsx") == {"main.py": "print(2)", "requirements.txt": "xlwings_utils"}
+    finally:
+        stop.set()
+        thread.join()
+    out = capsys.readouterr().out
+    assert out.startswith("replaced main.py in book.xlsx")
+    assert "requirements.txt" not in out
+
+
+def test_embed_package(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    Path("src/embedded_pkg/sub").mkdir(parents=True)
+    Path("src/embedded_pkg/__init__.py").write_text("from .sub.calc import double\n")
+    Path("src/embedded_pkg/sub/__init__.py").write_text("")
+    Path("src/embedded_pkg/sub/calc.py").write_text("def double(x):\n    return 2 * x\n")
+    Path("src/embedded_mod.py").write_text("VALUE = 42\n")
+    make_workbook("book.xlsx", {"main.py": "print(1)"})
+    Path("main.py").write_text("import xlwings_utils as xwu\nembedded_pkg = xwu.import_embedded('embedded_pkg')\n")
+
+    xwu.main(["replace", "-m", "main.py", "--package", "src/embedded_pkg", "--package", "src/embedded_mod.py", "book.xlsx", "*"])
+    main_py = xwu.embedded_code("book.xlsx")["main.py"]
+    assert main_py.startswith("# <xlwings_utils embedded packages>")
+    assert main_py.endswith("embedded_pkg = xwu.import_embedded('embedded_pkg')")
+
+    Path("main.py").write_text("import xlwings_utils as xwu\n")
+    xwu.main(["replace", "-m", "main.py", "book.xlsx", "*"])  # embedded packages are kept
+    assert xwu.embedded_code("book.xlsx")["main.py"].count("register_embedded") == 2
+
+    xwu.main(["extract", "-m", "main_extracted.py", "book.xlsx"])
+    assert Path("main_extracted.py").read_text() == "import xlwings_utils as xwu"
+
+    with pytest.raises(ImportError):
+        xwu.import_embedded("embedded_pkg")
+    exec(main_py, {})  # registers the packages (and imports embedded_pkg), like xlwings Lite does at startup
+    try:
+        assert sys.modules["embedded_pkg"].double(21) == 42
+        assert xwu.import_embedded("embedded_mod").VALUE == 42
+        assert Path("my_packages/embedded_pkg/sub/calc.py").exists()
+    finally:
+        for name in ("embedded_pkg", "embedded_pkg.sub", "embedded_pkg.sub.calc", "embedded_mod"):
+            sys.modules.pop(name, None)
+        sys.path.remove("my_packages")
+        sys.path_importer_cache.pop("my_packages", None)
+
+
+def test_cloud_sessions(monkeypatch):
+    import types
+    from xlwings_utils import github, nextcloud
+
+    github.init(token="secret", pool_size=4, timeout=5)
+    assert github._session.headers["Authorization"] == "Bearer secret"
+    assert github._session.get_adapter("https://api.github.com")._pool_maxsize == 4
+    assert github._timeout == 5
+
+    requested = []
+
+    def fake_request(self, method, url, **kwargs):
+        requested.append((self, method, url, kwargs["timeout"]))
+        response = types.SimpleNamespace(json=lambda: [])
+        return response
+
+    monkeypatch.setattr(github._session.__class__, "request", fake_request)
+    github.dir(("owner", "repo", "path"))
+    github.get_repos("owner")
+    assert [(session, method, timeout) for session, method, url, timeout in requested] == [(github._session, "GET", 5)] * 2
+
+    import requests
+
+    def fake_not_found(self, method, url, **kwargs):
+        response = requests.Response()
+        response.status_code = 404
+        response.url = url
+        response._content = b'{"message": "Not Found"}'
+        return response
+
+    monkeypatch.setattr(github._session.__class__, "request", fake_not_found)
+    with pytest.raises(OSError):
+        github.read(("owner", "repo", "missing.py"), cached=False)
+
+    nextcloud.init(url="https://example.com/dav/", username="user", password="password")
+    assert nextcloud._session.auth == ("user", "password")
+    assert nextcloud._session is not github._session
+
+
+def test_read_many(tmp_path, monkeypatch):
+    import threading
+    from xlwings_utils import dropbox, local
+
+    for i in range(5):
+        local.write(tmp_path / f"file{i}.txt", f"contents{i}".encode())
+    paths = [tmp_path / f"file{i}.txt" for i in (3, 1, 3, 0)]
+    assert local.read_many(paths, max_workers=3) == [b"contents3", b"contents1", b"contents3", b"contents0"]
+    assert sorted(local.read_many(paths, as_completed=True)) == sorted((path, local.read(path)) for path in set(paths))
+
+    active = []
+    max_active = [0]
+    lock = threading.Lock()
+    reads = []
+
+    def fake_read(path):
+        with lock:
+            active.append(path)
+            max_active[0] = max(max_active[0], len(active))
+            reads.append(path)
+        time.sleep(0.02)
+        with lock:
+            active.remove(path)
+        return f"contents of {path}".encode()
+
+    monkeypatch.setattr(dropbox, "_read", fake_read)
+    monkeypatch.setattr(dropbox, "_login", lambda: None)
+    monkeypatch.setattr(dropbox.read, "cache", {"/cached.txt": b"cached"})
+    paths = [f"/file{i}.txt" for i in range(12)] + ["/cached.txt", "/file0.txt"]
+    result = dropbox.read_many(paths, max_workers=4)
+    assert result == [f"contents of /file{i}.txt".encode() for i in range(12)] + [b"cached", b"contents of /file0.txt"]
+    assert len(reads) == 12
+    assert 1 < max_active[0] <= 4
+    assert dropbox.read("/file5.txt") == b"contents of /file5.txt"
+    assert len(reads) == 12  # from the cache
+
+    import asyncio
+
+    reads.clear()
+    max_active[0] = 0
+    dropbox.read.cache.clear()
+    paths = [f"/file{i}.txt" for i in range(12)] + ["/file0.txt"]
+    result = asyncio.run(dropbox.read_many_async(paths, max_workers=3))
+    assert result == [f"contents of /file{i}.txt".encode() for i in range(12)] + [b"contents of /file0.txt"]
+    assert len(reads) == 12
+    assert 1 < max_active[0] <= 3
+    assert asyncio.run(dropbox.read_many_async(["/file3.txt"])) == [b"contents of /file3.txt"]
+    assert len(reads) == 12  # from the cache
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(dropbox, "dir", lambda path, recursive: ["/Python/dropbox_pkg/__init__.py", "/Python/dropbox_pkg/sub/__init__.py", "/Python/dropbox_pkg/__pycache__/x.pyc"])
+    monkeypatch.setattr(dropbox, "_read", lambda path: b"VALUE = 1\n")
+    try:
+        assert dropbox.import_from_folder("/Python/dropbox_pkg").VALUE == 1
+        assert Path("my_packages/dropbox_pkg/sub/__init__.py").exists()
+        assert not Path("my_packages/dropbox_pkg/__pycache__").exists()
+    finally:
+        sys.modules.pop("dropbox_pkg", None)
+        sys.path.remove("my_packages")
+        sys.path_importer_cache.pop("my_packages", None)
+
+
 if __name__ == "__main__":
     pytest.main(["-vv", "-s", "-x", __file__])
-
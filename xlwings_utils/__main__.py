@@ -1,3 +1,3 @@
 import sys
 from . import xlwings_utils
-xlwings_utils.main(sys.argv[1:])
\ No newline at end of file
+sys.exit(xlwings_utils.main(sys.argv[1:]))
\ No newline at end of file
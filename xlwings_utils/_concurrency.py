@@ -0,0 +1,111 @@
+import sys
+import threading
+import asyncio
+import concurrent.futures
+
+cache_lock = threading.Lock()
+
+
+def run_concurrently(function, items, max_workers, as_completed):
+    # yields function(item) for all items, in the order of items or of completion
+    # on pyodide, where threads are not available, the items are handled one after another
+    if sys.platform == "emscripten" or max_workers <= 1:
+        yield from map(function, items)
+        return
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(function, item) for item in items]
+        for future in concurrent.futures.as_completed(futures) if as_completed else futures:
+            yield future.result()
+
+
+def read_many(fetch, paths, max_workers=8, cache=None, as_completed=False):
+    """
+    reads a number of files concurrently, with threads
+
+    Parameters
+    ----------
+    fetch : callable
+        function that reads one file (without caching)
+
+    paths : iterable
+        paths to read from (should be hashable)
+
+    max_workers : int
+        maximum number of files read at the same time (default 8)
+
+    cache : dict
+        if given, cached contents are used and all contents read are added
+
+        if None (default), no caching
+
+    as_completed : bool
+        if False (default), return the contents in the order of paths
+
+        if True, return an iterator of (path, contents) tuples, in the order of completion
+
+    Returns
+    -------
+    contents of the files : list of bytes (or iterator of tuples if as_completed is True)
+
+    Note
+    ----
+    On pyodide, the files are read one after another (use read_many_async there).
+    """
+    paths = list(paths)
+
+    def read_one(path):
+        if cache is not None and path in cache:
+            return path, cache[path]
+        result = fetch(path)
+        if cache is not None:
+            with cache_lock:
+                cache[path] = result
+        return path, result
+
+    results = run_concurrently(read_one, list(dict.fromkeys(paths)), max_workers, as_completed)
+    if as_completed:
+        return results
+    contents = dict(results)
+    return [contents[path] for path in paths]
+
+
+async def read_many_async(fetch_async, paths, max_workers=8, cache=None):
+    """
+    reads a number of files concurrently, with asyncio
+
+    Parameters
+    ----------
+    fetch_async : coroutine function
+        reads one file (without caching)
+
+    paths : iterable
+        paths to read from (should be hashable)
+
+    max_workers : int
+        maximum number of files read at the same time (default 8)
+
+    cache : dict
+        if given, cached contents are used and all contents read are added
+
+        if None (default), no caching
+
+    Returns
+    -------
+    contents of the files, in the order of paths : list of bytes
+    """
+    paths = list(paths)
+    semaphore = asyncio.Semaphore(max_workers)
+
+    async def read_one(path):
+        if cache is not None and path in cache:
+            return cache[path]
+        async with semaphore:
+            result = await fetch_async(path)
+        if cache is not None:
+            with cache_lock:
+                cache[path] = result
+        return result
+
+    unique_paths = list(dict.fromkeys(paths))
+    contents = dict(zip(unique_paths, await asyncio.gather(*(read_one(path) for path in unique_paths))))
+    return [contents[path] for path in paths]
@@ -0,0 +1,14 @@
+import sys
+import requests
+import requests.adapters
+
+
+def make_session(pool_size):
+    # a session with a connection pool of pool_size connections per host
+    # on pyodide, no adapter is mounted, so requests keep using the default (pyodide_http) one
+    session = requests.Session()
+    if sys.platform != "emscripten":
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+    return session
@@ -4,8 +4,13 @@ import json
 import importlib
 from pathlib import Path
 import sys
+import asyncio
+from . import _concurrency
+from . import _http
 
 _token = None
+_session = None
+_timeout = 60
 missing = object()
 
 
@@ -18,7 +23,7 @@ def normalize_path(path):
     return path
 
 
-def init(refresh_token=missing, app_key=missing, app_secret=missing, **kwargs):
+def init(refresh_token=missing, app_key=missing, app_secret=missing, pool_size=10, timeout=60, **kwargs):
     """
     This function may to be called prior to using any dropbox function
     to specify the request token, app key and app secret.
@@ -43,12 +48,20 @@ def init(refresh_token=missing, app_key=missing, app_secret=missing, **kwargs):
 
         if omitted: use the environment variable DROPBOX.APP_SECRET
 
+    pool_size : int
+        maximum number of connections to keep open for reuse (default 10)
+
+    timeout : float
+        timeout of each request, in seconds (default 60)
+
     Returns
     -------
     dropbox object
     """
 
     global _token
+    global _session
+    global _timeout
     try:
         import pyodide_http
 
@@ -73,16 +86,20 @@ def init(refresh_token=missing, app_key=missing, app_secret=missing, **kwargs):
         else:
             raise ValueError("no DROPBOX.APP_SECRET found in environment.")
 
-    response = requests.post(
+    session = _http.make_session(pool_size)
+    response = session.post(
         "https://api.dropbox.com/oauth2/token",
         data={"grant_type": "refresh_token", "refresh_token": refresh_token, "client_id": app_key, "client_secret": app_secret},
-        timeout=30,
+        timeout=timeout,
     )
     try:
         response.raise_for_status()
     except requests.exceptions.HTTPError:
         raise ValueError("invalid dropbox credentials")
     _token = response.json()["access_token"]
+    session.headers["Authorization"] = f"Bearer {_token}"  # set once for all requests of the session
+    _session = session
+    _timeout = timeout
 
 
 def _login():
@@ -124,9 +141,8 @@ def dir(path="", recursive=False, show_files=True, show_folders=False):
     path = normalize_path(path)
 
     API_RPC = "https://api.dropboxapi.com/2"
-    headers = {"Authorization": f"Bearer {_token}", "Content-Type": "application/json"}
     payload = {"path": path, "recursive": recursive, "include_deleted": False}
-    response = requests.post("https://api.dropboxapi.com/2/files/list_folder", headers=headers, json=payload, timeout=30)
+    response = _session.post(f"{API_RPC}/files/list_folder", json=payload, timeout=_timeout)
     try:
         response.raise_for_status()
     except requests.exceptions.HTTPError as e:
@@ -134,7 +150,7 @@ def dir(path="", recursive=False, show_files=True, show_folders=False):
     data = response.json()
     entries = data["entries"]
     while data.get("has_more"):
-        response = requests.post(f"{API_RPC}/files/list_folder/continue", headers=headers, json={"cursor": data["cursor"]}, timeout=30)
+        response = _session.post(f"{API_RPC}/files/list_folder/continue", json={"cursor": data["cursor"]}, timeout=_timeout)
         try:
             response.raise_for_status()
         except requests.exceptions.HTTPError as e:
@@ -184,11 +200,21 @@ def read(path, cached=True):
     else:
         read.cache = {}
     _login()
+    result = _read(path)
+    with _concurrency.cache_lock:
+        read.cache[path] = result
+    return result
+
+
+read.cache = {}
 
+
+def _read(path):
+    # reads the file, without caching
     path = normalize_path(path)
 
-    headers = {"Authorization": f"Bearer {_token}", "Dropbox-API-Arg": json.dumps({"path": path})}
-    with requests.post("https://content.dropboxapi.com/2/files/download", headers=headers, stream=True, timeout=60) as response:
+    headers = {"Dropbox-API-Arg": json.dumps({"path": path})}
+    with _session.post("https://content.dropboxapi.com/2/files/download", headers=headers, stream=True, timeout=_timeout) as response:
         try:
             response.raise_for_status()
         except requests.exceptions.HTTPError as e:
@@ -197,12 +223,74 @@ def read(path, cached=True):
         for chunk in response.iter_content(chunk_size=1024):
             if chunk:
                 chunks.append(chunk)
-    result = b"".join(chunks)
-    read.cache[path] = result
-    return result
+    return b"".join(chunks)
 
 
-read.cache = {}
+async def _read_async(path):
+    # reads the file, without caching
+    if sys.platform != "emscripten":
+        return await asyncio.to_thread(_read, path)
+    from pyodide.http import pyfetch
+
+    headers = {"Authorization": f"Bearer {_token}", "Dropbox-API-Arg": json.dumps({"path": normalize_path(path)})}
+    response = await pyfetch("https://content.dropboxapi.com/2/files/download", method="POST", headers=headers)
+    if not response.ok:
+        raise OSError(f"file {str(path)} not found. Original message is {response.status} {response.status_text}")
+    return await response.bytes()
+
+
+def read_many(paths, max_workers=8, cached=True, as_completed=False):
+    """
+    read a number of dropbox files concurrently (with threads)
+
+    Parameters
+    ----------
+    paths : iterable of str or Pathlib.Path
+        files to read
+
+    max_workers : int
+        maximum number of files read at the same time (default 8)
+
+    cached : bool
+        like read(): if True (default), cached results are used and all results are cached
+
+    as_completed : bool
+        if False (default), return the contents in the order of paths
+
+        if True, return an iterator of (path, contents) tuples, in the order of completion
+
+    Returns
+    -------
+    contents of the dropbox files : list of bytes (or iterator of tuples if as_completed is True)
+
+    Note
+    ----
+    On pyodide, where threads are not available, the files are read one after another. Use read_many_async there.
+    """
+    if not cached:
+        read.cache = {}
+    _login()
+    return _concurrency.read_many(_read, paths, max_workers=max_workers, cache=read.cache, as_completed=as_completed)
+
+
+async def read_many_async(paths, max_workers=8, cached=True):
+    """
+    read a number of dropbox files concurrently (with asyncio), like read_many
+
+    Returns
+    -------
+    contents of the dropbox files, in the order of paths : list of bytes
+
+    Note
+    ----
+    On pyodide (like in xlwings Lite), the files are read with pyfetch, so use this like ::
+
+        contents = await xwu.dropbox.read_many_async(paths)
+    """
+    if not cached:
+        read.cache = {}
+    _login()
+    return await _concurrency.read_many_async(_read_async, paths, max_workers=max_workers, cache=read.cache)
 
 
 def write(path, contents):
@@ -230,13 +318,12 @@ def write(path, contents):
     path = normalize_path(path)
 
     headers = {
-        "Authorization": f"Bearer {_token}",
         "Dropbox-API-Arg": json.dumps(
             {"path": str(path), "mode": "overwrite", "autorename": False, "mute": False}  # Where it will be saved in Dropbox  # "add" or "overwrite"
         ),
         "Content-Type": "application/octet-stream",
     }
-    response = requests.post("https://content.dropboxapi.com/2/files/upload", headers=headers, data=contents)
+    response = _session.post("https://content.dropboxapi.com/2/files/upload", headers=headers, data=contents, timeout=_timeout)
     try:
         response.raise_for_status()
     except requests.exceptions.HTTPError as e:
@@ -264,11 +351,11 @@ def delete(path):
     _login()
     path = normalize_path(path)
 
-    headers = {"Authorization": f"Bearer {_token}", "Content-Type": "application/json"}
+    headers = {"Content-Type": "application/json"}
 
     data = {"path": str(path)}  # Path in Dropbox, starting with /
 
-    response = requests.post("https://api.dropboxapi.com/2/files/delete_v2", headers=headers, data=json.dumps(data))
+    response = _session.post("https://api.dropboxapi.com/2/files/delete_v2", headers=headers, data=json.dumps(data), timeout=_timeout)
     try:
         response.raise_for_status()
     except requests.exceptions.HTTPError as e:
@@ -307,13 +394,11 @@ def import_from_folder(folder_name):
     my_packages = Path("my_packages/")
     my_packages.mkdir(parents=True, exist_ok=True)
 
-    for entry in dir(folder_name, recursive=True):
-        entry_path = Path(entry)
+    entry_paths = [Path(entry) for entry in dir(folder_name, recursive=True)]
+    entry_paths = [entry_path for entry_path in entry_paths if "__pycache__" not in str(entry_path.relative_to(folder_name_path))]
+    for entry_path, contents in zip(entry_paths, read_many([entry_path.as_posix() for entry_path in entry_paths])):
         rel_path = entry_path.relative_to(folder_name_path)
-        if "__pycache__" in str(rel_path):
-            continue
-        contents = read(entry_path.as_posix())
-        (my_packages / module_name).mkdir(parents=True, exist_ok=True)
+        (my_packages / module_name / rel_path).parent.mkdir(parents=True, exist_ok=True)
         with open(my_packages / module_name / rel_path, "wb") as f:
             f.write(contents)
 
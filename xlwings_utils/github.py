@@ -3,15 +3,20 @@ import requests
 from pathlib import Path
 import importlib
 import sys
+import asyncio
 import base64
 from urllib.parse import unquote
+from . import _concurrency
+from . import _http
 
 
 missing = object()
 _initialized = False
+_session = None
+_timeout = 60
 
 
-def init(token=missing):
+def init(token=missing, pool_size=10, timeout=60):
     """
     This function may to be called prior to using any github function
     to specify the owner and token.
@@ -23,6 +28,11 @@ def init(token=missing):
 
         if omitted: try to get the environment variable GITHUB.TOKEN
 
+    pool_size : int
+        maximum number of connections to keep open for reuse (default 10)
+
+    timeout : float
+        timeout of each request, in seconds (default 60)
 
     Returns
     -------
@@ -31,6 +41,8 @@ def init(token=missing):
 
     global _headers
     global _initialized
+    global _session
+    global _timeout
 
     try:
         import pyodide_http
@@ -49,6 +61,9 @@ def init(token=missing):
         _headers = {}
     else:
         _headers = {"Authorization": f"Bearer {token}"}
+    _session = _http.make_session(pool_size)
+    _session.headers.update(_headers)  # set once for all requests of the session
+    _timeout = timeout
 
 
 def _login():
@@ -93,7 +108,7 @@ def dir(orp, recursive=False, show_files=True, show_folders=False):
 
     url = unquote(f"https://api.github.com/repos/{owner}/{repo}/contents/{path}")
 
-    resp = requests.get(url, headers=_headers)
+    resp = _session.get(url, timeout=_timeout)
     files = resp.json()
     if not isinstance(files, list):
         raise ValueError("incorrect", files)
@@ -139,17 +154,100 @@ def read(orp, cached=True):
             return read.cache[orp]
     else:
         read.cache = {}
+    content = _read(orp)
+    with _concurrency.cache_lock:
+        read.cache[orp] = content
+    return content
+
+
+read.cache = {}
+
+
+def _read(orp):
+    # reads the file, without caching
     owner, repo, path = orp
 
     file_url = unquote(f"https://api.github.com/repos/{owner}/{repo}/contents/{path}?ref=main")
-    data = requests.get(file_url).json()
+    response = _session.get(file_url, timeout=_timeout)
+    try:
+        response.raise_for_status()
+    except requests.exceptions.HTTPError as e:
+        raise OSError(f"file {str(path)} not found. Original message is {e}") from None
+    data = response.json()
+    if "content" not in data:
+        raise OSError(f"file {str(path)} could not be read")
+    return base64.b64decode(data["content"])
 
-    content = base64.b64decode(data["content"])
-    read.cache[orp] = content
-    return content
 
+async def _read_async(orp):
+    # reads the file, without caching
+    if sys.platform != "emscripten":
+        return await asyncio.to_thread(_read, orp)
+    from pyodide.http import pyfetch
 
-read.cache = {}
+    owner, repo, path = orp
+    file_url = unquote(f"https://api.github.com/repos/{owner}/{repo}/contents/{path}?ref=main")
+    response = await pyfetch(file_url, headers=_headers)
+    if not response.ok:
+        raise OSError(f"file {str(path)} not found. Original message is {response.status} {response.status_text}")
+    data = await response.json()
+    if "content" not in data:
+        raise OSError(f"file {str(path)} could not be read")
+    return base64.b64decode(data["content"])
+
+
+def read_many(paths, max_workers=8, cached=True, as_completed=False):
+    """
+    read a number of github files concurrently (with threads)
+
+    Parameters
+    ----------
+    paths : iterable of orps (tuple of owner, repo and path)
+        files to read
+
+    max_workers : int
+        maximum number of files read at the same time (default 8)
+
+    cached : bool
+        like read(): if True (default), cached results are used and all results are cached
+
+    as_completed : bool
+        if False (default), return the contents in the order of paths
+
+        if True, return an iterator of (path, contents) tuples, in the order of completion
+
+    Returns
+    -------
+    contents of the github files : list of bytes (or iterator of tuples if as_completed is True)
+
+    Note
+    ----
+    On pyodide, where threads are not available, the files are read one after another. Use read_many_async there.
+    """
+    if not cached:
+        read.cache = {}
+    _login()
+    return _concurrency.read_many(_read, paths, max_workers=max_workers, cache=read.cache, as_completed=as_completed)
+
+
+async def read_many_async(paths, max_workers=8, cached=True):
+    """
+    read a number of github files concurrently (with asyncio), like read_many
+
+    Returns
+    -------
+    contents of the github files, in the order of paths : list of bytes
+
+    Note
+    ----
+    On pyodide (like in xlwings Lite), the files are read with pyfetch, so use this like ::
+
+        contents = await xwu.github.read_many_async(paths)
+    """
+    if not cached:
+        read.cache = {}
+    _login()
+    return await _concurrency.read_many_async(_read_async, paths, max_workers=max_workers, cache=read.cache)
 
 
 def get_repos(owner):
@@ -160,7 +258,7 @@ def get_repos(owner):
 
     while True:
         url = unquote(f"https://api.github.com/users/{owner}/repos?per_page=100&page={page}")
-        response = requests.get(url).json()
+        response = _session.get(url, timeout=_timeout).json()
         if not response:
             break
         result.extend(repo["name"] for repo in response)
@@ -197,14 +295,11 @@ def import_from_folder(orp):
     my_packages = Path("my_packages")
     my_packages.mkdir(parents=True, exist_ok=True)
 
-    for entry in dir(orp, recursive=True):
-        entry_path = Path(entry)
+    entry_paths = [Path(entry) for entry in dir(orp, recursive=True)]
+    entry_paths = [entry_path for entry_path in entry_paths if "__pycache__" not in str(entry_path.relative_to(folder_name_path))]
+    for entry_path, contents in zip(entry_paths, read_many([(owner, repo, entry_path.as_posix()) for entry_path in entry_paths])):
         rel_path = entry_path.relative_to(folder_name_path)
-        if "__pycache__" in str(rel_path):
-            continue
-        contents = read((owner, repo, entry_path.as_posix()))
-
-        (my_packages / module_name).mkdir(parents=True, exist_ok=True)
+        (my_packages / module_name / rel_path).parent.mkdir(parents=True, exist_ok=True)
         with open(my_packages / module_name / rel_path, "wb") as f:
             f.write(contents)
 
@@ -1,7 +1,7 @@
 from pathlib import Path
 import sys
 import importlib
-from pathlib import Path
+from . import _concurrency
 
 def dir(path, recursive=False, show_files=True, show_folders=False):
     """
@@ -54,7 +54,32 @@ def read(path):
     with open(path, "rb") as f:
         contents = f.read()
     return contents
-    
+
+
+def read_many(paths, max_workers=8, as_completed=False):
+    """
+    read a number of local files concurrently (with threads)
+
+    Parameters
+    ----------
+    paths : iterable of str or Pathlib.Path
+        files to read
+
+    max_workers : int
+        maximum number of files read at the same time (default 8)
+
+    as_completed : bool
+        if False (default), return the contents in the order of paths
+
+        if True, return an iterator of (path, contents) tuples, in the order of completion
+
+    Returns
+    -------
+    contents of the local files : list of bytes (or iterator of tuples if as_completed is True)
+    """
+    return _concurrency.read_many(read, paths, max_workers=max_workers, as_completed=as_completed)
+
+
 def import_from_folder(folder_name):
     """
     imports a module from a folder
@@ -3,8 +3,12 @@ import xml.etree.ElementTree
 import urllib.parse
 import os
 import sys
+import base64
+import asyncio
 import importlib
 from pathlib import Path
+from . import _concurrency
+from . import _http
 
 
 try:
@@ -15,6 +19,8 @@ except ImportError:
 missing = object()
 
 _url = None
+_session = None
+_timeout = 60
 
 
 def make_base_path(webdav_url: str) -> str:
@@ -55,9 +61,39 @@ def clean_href(href: str, base_path: str) -> str:
     return rel.lstrip("/")
 
 
-def init(url=missing, username=missing, password=missing, **kwargs):
-    global _auth
+def init(url=missing, username=missing, password=missing, pool_size=10, timeout=60, **kwargs):
+    """
+    This function may to be called prior to using any nextcloud function
+    to specify the url, username and password.
+    If these are specified as NEXTCLOUD.URL, NEXTCLOUD.USERNAME and NEXTCLOUD.PASSWORD
+    environment variables, it is not necessary to call nextcloud.init().
+
+    Parameters
+    ----------
+    url : str
+        WebDAV url
+
+        if omitted: use the environment variable NEXTCLOUD.URL
+
+    username : str
+        user name
+
+        if omitted: use the environment variable NEXTCLOUD.USERNAME
+
+    password : str
+        (app) password
+
+        if omitted: use the environment variable NEXTCLOUD.PASSWORD
+
+    pool_size : int
+        maximum number of connections to keep open for reuse (default 10)
+
+    timeout : float
+        timeout of each request, in seconds (default 60)
+    """
     global _url
+    global _session
+    global _timeout
     try:
         import pyodide_http
 
@@ -82,7 +118,9 @@ def init(url=missing, username=missing, password=missing, **kwargs):
         else:
             raise ValueError("no NEXTCLOUD.PASSWORD found in environment.")
     _url = url
-    _auth = (username, password)
+    _session = _http.make_session(pool_size)
+    _session.auth = (username, password)  # set once for all requests of the session
+    _timeout = timeout
 
 
 def _login():
@@ -124,7 +162,7 @@ def dir(path="", recursive=False, show_files=True, show_folders=False):
 
     headers = {"Depth": "1000" if recursive else "1"}  # 1 = directory + its immediate children
 
-    response = requests.request("PROPFIND", _url + path, auth=_auth, headers=headers)
+    response = _session.request("PROPFIND", _url + path, headers=headers, timeout=_timeout)
 
     response.raise_for_status()
     root = xml.etree.ElementTree.fromstring(response.text)
@@ -184,17 +222,90 @@ def read(path, cached=True):
         read.cache = {}
 
     _login()
-    response = requests.get(_url + path, auth=_auth)
+    result = _read(path)
+    with _concurrency.cache_lock:
+        read.cache[path] = result
+    return result
+
+
+read.cache = {}
+
+
+def _read(path):
+    # reads the file, without caching
+    response = _session.get(_url + str(path), timeout=_timeout)
     try:
         response.raise_for_status()
     except requests.exceptions.HTTPError as e:
         raise OSError(f"file {str(path)} not found. Original message is {e}") from None
-    result = response.content
-    read.cache[path] = result
-    return result
+    return response.content
 
 
-read.cache = {}
+async def _read_async(path):
+    # reads the file, without caching
+    if sys.platform != "emscripten":
+        return await asyncio.to_thread(_read, path)
+    from pyodide.http import pyfetch
+
+    credentials = base64.b64encode(":".join(_session.auth).encode("utf-8")).decode("ascii")
+    response = await pyfetch(_url + str(path), headers={"Authorization": f"Basic {credentials}"})
+    if not response.ok:
+        raise OSError(f"file {str(path)} not found. Original message is {response.status} {response.status_text}")
+    return await response.bytes()
+
+
+def read_many(paths, max_workers=8, cached=True, as_completed=False):
+    """
+    read a number of nextcloud files concurrently (with threads)
+
+    Parameters
+    ----------
+    paths : iterable of str or Pathlib.Path
+        files to read
+
+    max_workers : int
+        maximum number of files read at the same time (default 8)
+
+    cached : bool
+        like read(): if True (default), cached results are used and all results are cached
+
+    as_completed : bool
+        if False (default), return the contents in the order of paths
+
+        if True, return an iterator of (path, contents) tuples, in the order of completion
+
+    Returns
+    -------
+    contents of the nextcloud files : list of bytes (or iterator of tuples if as_completed is True)
+
+    Note
+    ----
+    On pyodide, where threads are not available, the files are read one after another. Use read_many_async there.
+    """
+    if not cached:
+        read.cache = {}
+    _login()
+    return _concurrency.read_many(_read, paths, max_workers=max_workers, cache=read.cache, as_completed=as_completed)
+
+
+async def read_many_async(paths, max_workers=8, cached=True):
+    """
+    read a number of nextcloud files concurrently (with asyncio), like read_many
+
+    Returns
+    -------
+    contents of the nextcloud files, in the order of paths : list of bytes
+
+    Note
+    ----
+    On pyodide (like in xlwings Lite), the files are read with pyfetch, so use this like ::
+
+        contents = await xwu.nextcloud.read_many_async(paths)
+    """
+    if not cached:
+        read.cache = {}
+    _login()
+    return await _concurrency.read_many_async(_read_async, paths, max_workers=max_workers, cache=read.cache)
 
 
 def write(path, contents):
@@ -219,7 +330,7 @@ def write(path, contents):
     it is not necessary to call nextcloud_init() prior to any nextcloud function.
     """
     _login()
-    response = requests.put(_url + path, auth=_auth, data=contents, timeout=60)
+    response = _session.put(_url + path, data=contents, timeout=_timeout)
     try:
         response.raise_for_status()
     except requests.exceptions.HTTPError as e:
@@ -246,7 +357,7 @@ def delete(path):
     """
     _login()
 
-    response = requests.delete(_url + path, auth=_auth, timeout=30)
+    response = _session.delete(_url + path, timeout=_timeout)
     try:
         response.raise_for_status()
     except requests.exceptions.HTTPError as e:
@@ -280,13 +391,11 @@ def import_from_folder(folder_name):
     my_packages = Path("my_packages/")
     my_packages.mkdir(parents=True, exist_ok=True)
 
-    for entry in dir(folder_name, recursive=True):
-        entry_path = Path(entry)
+    entry_paths = [Path(entry) for entry in dir(folder_name, recursive=True)]
+    entry_paths = [entry_path for entry_path in entry_paths if "__pycache__" not in str(entry_path.relative_to(folder_name_path))]
+    for entry_path, contents in zip(entry_paths, read_many([entry_path.as_posix() for entry_path in entry_paths])):
         rel_path = entry_path.relative_to(folder_name_path)
-        if "__pycache__" in str(rel_path):
-            continue
-        contents = read(entry_path.as_posix())
-        (my_packages / module_name).mkdir(parents=True, exist_ok=True)
+        (my_packages / module_name / rel_path).parent.mkdir(parents=True, exist_ok=True)
         with open(my_packages / module_name / rel_path, "wb") as f:
             f.write(contents)
 
@@ -5,19 +5,39 @@
 #  /_/\_\|_|  \_/\_/  |_||_| |_| \__, ||___/ _____  \__,_| \__||_||_||___/
 #                                |___/      |_____|
 
-__version__ = "26.1.1"
+__version__ = "26.2.0"
 
 from pathlib import Path
 import sys
+import os
 import math
+import numbers
+import operator
 import base64
 import datetime
 import functools
+import fnmatch
+import glob
 import argparse
 import zipfile
 from lxml import etree
 import json
 import io
+import logging
+import contextlib
+import contextvars
+import threading
+import time
+import collections
+import collections.abc
+import itertools
+import tempfile
+import zlib
+import hashlib
+import importlib
+import copy
+import struct
+import shutil
 
 Pythonista = sys.platform == "ios"
 
@@ -29,6 +49,15 @@ except ImportError:
 missing = object()
 
 
+def _is_number(item):
+    # booleans are not considered to be numbers, like in Excel
+    return isinstance(item, numbers.Real) and not isinstance(item, bool)
+
+
+def _is_empty(item):
+    return (item is None) or (item == "") or (isinstance(item, float) and math.isnan(item))
+
+
 class block:
     """
     block is 2 dimensional data structure with 1 as lowest index (like xlwings range)
@@ -41,24 +70,92 @@ class block:
     number_of_columns : int
         number of columns (default 1)
 
+    intern : bool
+        if False (default), values are stored as is
+
+        if True, equal values in a column are stored as one shared object, which can save a lot of memory
+        if values (like status codes or units) are repeated often. See also categories() and codes()
+
     Returns
     -------
     block
     """
 
-    def __init__(self, number_of_rows=1, number_of_columns=1):
+    def __init__(self, number_of_rows=1, number_of_columns=1, intern=False):
         self.dict = {}
+        self._version = 0  # incremented on every change (via the block's methods), see _digest
+        self._digest_cache = None
+        self._categories = {} if intern else None
         self.number_of_rows = number_of_rows
         self.number_of_columns = number_of_columns
         self._invalidate_highest_used_cache()
 
     def __eq__(self, other):
         if isinstance(other, block):
-            return self.value == other.value
+            return (self.number_of_rows, self.number_of_columns) == (other.number_of_rows, other.number_of_columns) and self.dict == other.dict
         return False
 
+    def diff(self, other):
+        """
+        determines the differences between this block and another block
+
+        Parameters
+        ----------
+        other : block
+            block to compare with (usually a newer version of this block)
+
+        Returns
+        -------
+        diff : dict
+            "number_of_rows" and "number_of_columns" : dimensions of other
+
+            "added" : list of [row, column, value] of cells that are only occupied in other
+
+            "removed" : list of [row, column] of cells that are only occupied in this block
+
+            "changed" : list of [row, column, value] of cells that have a different value in other
+
+        Note
+        ----
+        Only the occupied cells of both blocks are visited.
+
+        If the values are JSON serializable, so is the diff, which makes it suitable to be stored or transferred.
+        """
+        this_dict = self.dict
+        other_dict = other.dict
+        added = []
+        changed = []
+        for key, value in other_dict.items():
+            if key in this_dict:
+                if this_dict[key] != value:
+                    changed.append([*key, value])
+            else:
+                added.append([*key, value])
+        removed = [[*key] for key in this_dict if key not in other_dict]
+        return dict(number_of_rows=other.number_of_rows, number_of_columns=other.number_of_columns, added=added, removed=removed, changed=changed)
+
+    def apply_diff(self, diff):
+        """
+        applies a diff (as returned by diff()) to this block (in place)
+
+        Parameters
+        ----------
+        diff : dict
+            diff to be applied
+        """
+        for row, column in diff["removed"]:  # before resizing, as removed cells may lie outside the new size
+            self[row, column] = None
+        if self.number_of_rows != diff["number_of_rows"]:
+            self.number_of_rows = diff["number_of_rows"]
+        if self.number_of_columns != diff["number_of_columns"]:
+            self.number_of_columns = diff["number_of_columns"]
+        for row, column, value in diff["added"]:
+            self[row, column] = value
+        for row, column, value in diff["changed"]:
+            self[row, column] = value
+
     @classmethod
-    def from_value(cls, value, column_like=False):
+    def from_value(cls, value, column_like=False, intern=False):
         """
         makes a block from a given value
 
@@ -70,6 +167,11 @@ class block:
         column_like : boolean
             if value is a list of scalars, values is interpreted as a column if True, as a row otherwise
 
+        intern : bool
+            if True, equal values in a column are stored as one shared object (see block)
+
+            default: False
+
         Returns
         -------
         block : block
@@ -83,19 +185,19 @@ class block:
                 value = [[item] for item in value]
             else:
                 value = [value]
-        bl = cls(len(value), 1)
+        bl = cls(len(value), 1, intern=intern)
 
         for row, row_contents in enumerate(value, 1):
             for column, item in enumerate(row_contents, 1):
-                if (item is None) or (item == "") or (isinstance(item, float) and math.isnan(item)):
+                if _is_empty(item):
                     ...  # ignore this item
                 else:
-                    bl.dict[row, column] = item
+                    bl.dict[row, column] = bl._intern(column, item) if intern else item
                 bl._number_of_columns = max(bl.number_of_columns, column)
         return bl
 
     @classmethod
-    def from_range(cls, rng):
+    def from_range(cls, rng, intern=False):
         """
         makes a block from a given range
 
@@ -104,15 +206,20 @@ class block:
         rng : xlwings.Range
             range to be used be used in block
 
+        intern : bool
+            if True, equal values in a column are stored as one shared object (see block)
+
+            default: False
+
         Returns
         -------
         block : block
         """
         number_of_rows, number_of_columns = rng.shape
-        return cls.from_value(rng.value, column_like=(number_of_columns == 1))
+        return cls.from_value(rng.value, column_like=(number_of_columns == 1), intern=intern)
 
     @classmethod
-    def from_xlrd_sheet(cls, sheet):
+    def from_xlrd_sheet(cls, sheet, intern=False):
         """
         makes a block from a xlrd sheet
 
@@ -121,15 +228,20 @@ class block:
         sheet : xlrd sheet
             sheet to be used be used in block
 
+        intern : bool
+            if True, equal values in a column are stored as one shared object (see block)
+
+            default: False
+
         Returns
         -------
         block : block
         """
         v = [sheet.row_values(row_idx)[0 : sheet.ncols] for row_idx in range(0, sheet.nrows)]
-        return cls.from_value(v)
+        return cls.from_value(v, intern=intern)
 
     @classmethod
-    def from_openpyxl_sheet(cls, sheet):
+    def from_openpyxl_sheet(cls, sheet, intern=False):
         """
         makes a block from an openpyxl sheet
 
@@ -138,15 +250,20 @@ class block:
         sheet : xlrd sheet
             sheet to be used be used in block
 
+        intern : bool
+            if True, equal values in a column are stored as one shared object (see block)
+
+            default: False
+
         Returns
         -------
         block : block
         """
         v = [[cell.value for cell in row] for row in sheet.iter_rows()]
-        return cls.from_value(v)
+        return cls.from_value(v, intern=intern)
 
     @classmethod
-    def from_file(cls, filename):
+    def from_file(cls, filename, intern=False):
         """
         makes a block from a file
 
@@ -155,16 +272,21 @@ class block:
         filename : str
             file to be used be used in block
 
+        intern : bool
+            if True, equal values in a column are stored as one shared object (see block)
+
+            default: False
+
         Returns
         -------
         block : block
         """
         with open(filename, "r") as f:
             v = [[line if line else missing] for line in f.read().splitlines()]
-        return cls.from_value(v)
+        return cls.from_value(v, intern=intern)
 
     @classmethod
-    def from_dataframe(cls, df):
+    def from_dataframe(cls, df, intern=False):
         """
         makes a block from a given dataframe
 
@@ -173,12 +295,17 @@ class block:
         df : pandas dataframe
             dataframe to be used be used in block
 
+        intern : bool
+            if True, equal values in a column are stored as one shared object (see block)
+
+            default: False
+
         Returns
         -------
         block : block
         """
         v = df.values.tolist()
-        return cls.from_value(v)
+        return cls.from_value(v, intern=intern)
 
     def to_openpyxl_sheet(self, sheet):
         """
@@ -216,7 +343,7 @@ class block:
             number_of_rows = self.number_of_rows
         if number_of_columns is missing:
             number_of_columns = self.number_of_columns
-        bl = block(number_of_rows=number_of_rows, number_of_columns=number_of_columns)
+        bl = block(number_of_rows=number_of_rows, number_of_columns=number_of_columns, intern=self.interned)
         for (row, column), value in self.dict.items():
             if row <= number_of_rows and column <= number_of_columns:
                 bl[row, column] = value
@@ -226,6 +353,15 @@ class block:
     def value(self):
         return [[self.dict.get((row, column)) for column in range(1, self.number_of_columns + 1)] for row in range(1, self.number_of_rows + 1)]
 
+    def _digest(self):
+        # sha256 digest of the dimensions and typed contents, as used by memoize
+        # the digest is cached until the block is changed (writing to block.dict directly bypasses this)
+        if self._digest_cache is None or self._digest_cache[0] != self._version:
+            contents = [(key, item.__class__.__name__, item) for key, item in sorted(self.dict.items(), key=operator.itemgetter(0))]
+            digest = hashlib.sha256(repr((self.number_of_rows, self.number_of_columns, contents)).encode("utf-8")).digest()
+            self._digest_cache = (self._version, digest)
+        return self._digest_cache[1]
+
     def _invalidate_highest_used_cache(self):
         self._highest_used_row_number = None
         self._highest_used_column_number = None
@@ -239,15 +375,85 @@ class block:
         if value is None:
             if (row, column) in self.dict:
                 del self.dict[row, column]
+                self._version += 1
                 self._invalidate_highest_used_cache()
 
         else:
+            if self._categories is not None:
+                value = self._intern(column, value)
             self.dict[row, column] = value
+            self._version += 1
             if self._highest_used_row_number:
                 self._highest_used_row_number = max(self._highest_used_row_number, row)
             if self._highest_used_column_number:
                 self._highest_used_column_number = max(self._highest_used_column_number, column)
 
+    def _intern(self, column, value):
+        table = self._categories.setdefault(column, {})
+        try:
+            return table.setdefault((value.__class__, value), value)  # the class is part of the key to keep 1, 1.0 and True apart
+        except TypeError:  # unhashable values are not interned
+            return value
+
+    @property
+    def interned(self):
+        """
+        Returns
+        -------
+        True if values are interned : bool
+        """
+        return self._categories is not None
+
+    def categories(self, column):
+        """
+        returns the category table of a column of an interned block
+
+        Parameters
+        ----------
+        column : int
+            column to return the category table of
+
+        Returns
+        -------
+        all distinct values that have been stored in the column, in order of first appearance : list
+
+        Note
+        ----
+        The index of a value in this list is its code, as returned by codes()
+        """
+        if self._categories is None:
+            raise ValueError("block is not interned")
+        self._check_column(column, "column")
+        return list(self._categories.get(column, {}).values())
+
+    def codes(self, column):
+        """
+        returns the values of a column of an interned block as small integer codes
+
+        Parameters
+        ----------
+        column : int
+            column to return the codes of
+
+        Returns
+        -------
+        code (index in categories(column)) for each row, None for empty cells : list
+
+        Note
+        ----
+        Unhashable values (like lists) are not interned, so their code is None as well.
+        """
+        categories = self.categories(column)
+        code_of = {(value.__class__, value): code for code, value in enumerate(categories)}
+        result = []
+        for row in range(1, self.number_of_rows + 1):
+            value = self.dict.get((row, column))
+            try:
+                result.append(None if value is None else code_of.get((value.__class__, value)))
+            except TypeError:  # unhashable, so not interned
+                result.append(None)
+        return result
+
     def __getitem__(self, row_column):
         row, column = row_column
         if row < 1 or row > self.number_of_rows:
@@ -274,6 +480,7 @@ class block:
         if value < 1:
             raise ValueError(f"number_of_rows should be >=1; not {value}")
         self._invalidate_highest_used_cache()
+        self._version += 1
         self._number_of_rows = value
         for row, column in list(self.dict):
             if row > self._number_of_rows:
@@ -288,6 +495,7 @@ class block:
         if value < 1:
             raise ValueError(f"number_of_columns should be >=1; not {value}")
         self._invalidate_highest_used_cache()
+        self._version += 1
         self._number_of_columns = value
         for row, column in list(self.dict):
             if column > self._number_of_columns:
@@ -335,11 +543,397 @@ class block:
         -------
         transposed block : block
         """
-        bl = block(number_of_rows=self.number_of_columns, number_of_columns=self.number_of_rows)
+        bl = block(number_of_rows=self.number_of_columns, number_of_columns=self.number_of_rows, intern=self.interned)
         for (row, column), value in self.dict.items():
             bl[column, row] = value
         return bl
 
+    def _operate(self, other, operation, reverse=False):
+        bl = block(number_of_rows=self.number_of_rows, number_of_columns=self.number_of_columns)
+        if isinstance(other, block):
+            if (self.number_of_rows, self.number_of_columns) != (other.number_of_rows, other.number_of_columns):
+                raise ValueError(
+                    f"blocks should have the same dimensions; not {self.number_of_rows}x{self.number_of_columns} and {other.number_of_rows}x{other.number_of_columns}"
+                )
+            additive = operation in (operator.add, operator.sub)
+            for key in self.dict.keys() | other.dict.keys():
+                value = self.dict.get(key)
+                other_value = other.dict.get(key)
+                # non-numeric cells of either block are left as is (those of this block take precedence)
+                if value is not None and not _is_number(value):
+                    bl.dict[key] = value
+                elif other_value is not None and not _is_number(other_value):
+                    bl.dict[key] = other_value
+                elif additive:
+                    # like in Excel, empty cells count as 0
+                    bl.dict[key] = operation(0 if value is None else value, 0 if other_value is None else other_value)
+                elif value is not None and other_value is not None:
+                    # for * and /, cells that are empty in either block remain empty
+                    bl.dict[key] = operation(value, other_value)
+        else:
+            # empty cells remain empty
+            for key, value in self.dict.items():
+                if _is_number(value):
+                    bl.dict[key] = operation(other, value) if reverse else operation(value, other)
+                else:
+                    bl.dict[key] = value  # non-numeric cells are left as is
+        return bl
+
+    def __add__(self, other):
+        return self._operate(other, operator.add)
+
+    def __radd__(self, other):
+        return self._operate(other, operator.add, reverse=True)
+
+    def __sub__(self, other):
+        return self._operate(other, operator.sub)
+
+    def __rsub__(self, other):
+        return self._operate(other, operator.sub, reverse=True)
+
+    def __mul__(self, other):
+        return self._operate(other, operator.mul)
+
+    def __rmul__(self, other):
+        return self._operate(other, operator.mul, reverse=True)
+
+    def __truediv__(self, other):
+        return self._operate(other, operator.truediv)
+
+    def __rtruediv__(self, other):
+        return self._operate(other, operator.truediv, reverse=True)
+
+    def _numbers(self, row, column):
+        if row is not missing:
+            self._check_row(row, "row")
+        if column is not missing:
+            self._check_column(column, "column")
+        for (this_row, this_column), value in self.dict.items():
+            if (row is missing or this_row == row) and (column is missing or this_column == column):
+                if _is_number(value):
+                    yield value
+
+    def _numbers_per(self, axis, row, column):
+        # returns a list with the numeric values per row or per column, collected in one pass
+        if row is not missing or column is not missing:
+            raise ValueError("axis cannot be combined with row or column")
+        if axis == "row":
+            result = [[] for _ in range(self.number_of_rows)]
+            for (this_row, this_column), value in self.dict.items():
+                if _is_number(value):
+                    result[this_row - 1].append(value)
+        elif axis == "column":
+            result = [[] for _ in range(self.number_of_columns)]
+            for (this_row, this_column), value in self.dict.items():
+                if _is_number(value):
+                    result[this_column - 1].append(value)
+        else:
+            raise ValueError(f"axis should be 'row' or 'column', not {axis!r}")
+        return result
+
+    def sum(self, row=missing, column=missing, axis=missing):
+        """
+        sum of all numeric values (like Excel's SUM)
+
+        Parameters
+        ----------
+        row : int
+            if given, only this row is used
+
+        column : int
+            if given, only this column is used
+
+        axis : str
+            if "row", return the sum per row
+
+            if "column", return the sum per column
+
+        Returns
+        -------
+        sum : int or float
+            0 if there are no numeric values
+
+            if axis is given, a list with the sum per row or per column
+
+        Note
+        ----
+        Empty cells, strings and booleans are ignored.
+        """
+        if axis is not missing:
+            return [sum(values) for values in self._numbers_per(axis, row, column)]
+        return sum(self._numbers(row, column))
+
+    def min(self, row=missing, column=missing, axis=missing):
+        """
+        minimum of all numeric values (like Excel's MIN)
+
+        Parameters
+        ----------
+        row : int
+            if given, only this row is used
+
+        column : int
+            if given, only this column is used
+
+        axis : str
+            if "row", return the minimum per row
+
+            if "column", return the minimum per column
+
+        Returns
+        -------
+        minimum : int or float
+
+            if axis is given, a list with the minimum per row or per column (None if there are no numeric values)
+
+        Note
+        ----
+        Empty cells, strings and booleans are ignored.
+
+        If there are no numeric values (and axis is not given), a ValueError will be raised.
+        """
+        if axis is not missing:
+            return [min(values, default=None) for values in self._numbers_per(axis, row, column)]
+        result = min(self._numbers(row, column), default=missing)
+        if result is missing:
+            raise ValueError("no numeric values")
+        return result
+
+    def max(self, row=missing, column=missing, axis=missing):
+        """
+        maximum of all numeric values (like Excel's MAX)
+
+        Parameters
+        ----------
+        row : int
+            if given, only this row is used
+
+        column : int
+            if given, only this column is used
+
+        axis : str
+            if "row", return the maximum per row
+
+            if "column", return the maximum per column
+
+        Returns
+        -------
+        maximum : int or float
+
+            if axis is given, a list with the maximum per row or per column (None if there are no numeric values)
+
+        Note
+        ----
+        Empty cells, strings and booleans are ignored.
+
+        If there are no numeric values (and axis is not given), a ValueError will be raised.
+        """
+        if axis is not missing:
+            return [max(values, default=None) for values in self._numbers_per(axis, row, column)]
+        result = max(self._numbers(row, column), default=missing)
+        if result is missing:
+            raise ValueError("no numeric values")
+        return result
+
+    def mean(self, row=missing, column=missing, axis=missing):
+        """
+        mean of all numeric values (like Excel's AVERAGE)
+
+        Parameters
+        ----------
+        row : int
+            if given, only this row is used
+
+        column : int
+            if given, only this column is used
+
+        axis : str
+            if "row", return the mean per row
+
+            if "column", return the mean per column
+
+        Returns
+        -------
+        mean : float
+
+            if axis is given, a list with the mean per row or per column (None if there are no numeric values)
+
+        Note
+        ----
+        Empty cells, strings and booleans are ignored.
+
+        If there are no numeric values (and axis is not given), a ValueError will be raised.
+        """
+        if axis is not missing:
+            return [sum(values) / len(values) if values else None for values in self._numbers_per(axis, row, column)]
+        values = list(self._numbers(row, column))
+        if not values:
+            raise ValueError("no numeric values")
+        return sum(values) / len(values)
+
+    def _region_bounds(self):
+        # union-find over the occupied cells, where cells that touch (also diagonally) are connected
+        parent = {key: key for key in self.dict}
+
+        def find(key):
+            while parent[key] != key:
+                parent[key] = parent[parent[key]]
+                key = parent[key]
+            return key
+
+        for row, column in self.dict:
+            for neighbour in ((row - 1, column - 1), (row - 1, column), (row - 1, column + 1), (row, column - 1)):
+                if neighbour in parent:
+                    root0 = find((row, column))
+                    root1 = find(neighbour)
+                    if root0 != root1:
+                        parent[root1] = root0
+
+        bounds = {}
+        for row, column in self.dict:
+            root = find((row, column))
+            if root in bounds:
+                top, left, bottom, right = bounds[root]
+                bounds[root] = (min(top, row), min(left, column), max(bottom, row), max(right, column))
+            else:
+                bounds[root] = (row, column, row, column)
+
+        return self._merge_rectangles(bounds.values())
+
+    @staticmethod
+    def _merge_rectangles(rectangles):
+        # like Excel's current region, bounding rectangles that overlap or touch are merged
+        # each pass is a sweep over the rectangles sorted by top, where only rectangles that reach the current top
+        # are compared; passes are repeated until merging doesn't make new rectangles touch
+        rectangles = sorted(rectangles)
+        while True:
+            parent = list(range(len(rectangles)))
+
+            def find_rectangle(i):
+                while parent[i] != i:
+                    parent[i] = parent[parent[i]]
+                    i = parent[i]
+                return i
+
+            active = []
+            for i, (top, left, bottom, right) in enumerate(rectangles):
+                active = [j for j in active if rectangles[j][2] + 1 >= top]
+                for j in active:
+                    top1, left1, bottom1, right1 = rectangles[j]
+                    if left <= right1 + 1 and left1 <= right + 1:
+                        root0 = find_rectangle(i)
+                        root1 = find_rectangle(j)
+                        if root0 != root1:
+                            parent[root1] = root0
+                active.append(i)
+
+            merged = {}
+            for i, (top, left, bottom, right) in enumerate(rectangles):
+                root = find_rectangle(i)
+                if root in merged:
+                    top1, left1, bottom1, right1 = merged[root]
+                    merged[root] = (min(top, top1), min(left, left1), max(bottom, bottom1), max(right, right1))
+                else:
+                    merged[root] = (top, left, bottom, right)
+            if len(merged) == len(rectangles):
+                return rectangles
+            rectangles = sorted(merged.values())
+
+    def _component_bounds(self, row, column, bounds, seen):
+        # extends bounds with the cells that touch (row, column), directly or indirectly (flood fill)
+        top, left, bottom, right = bounds
+        stack = [(row, column)]
+        while stack:
+            row, column = stack.pop()
+            top, left, bottom, right = min(top, row), min(left, column), max(bottom, row), max(right, column)
+            for neighbour_row in (row - 1, row, row + 1):
+                for neighbour_column in (column - 1, column, column + 1):
+                    neighbour = (neighbour_row, neighbour_column)
+                    if neighbour in self.dict and neighbour not in seen:
+                        seen.add(neighbour)
+                        stack.append(neighbour)
+        return (top, left, bottom, right)
+
+    def _sub_block(self, top, left, bottom, right):
+        bl = block(number_of_rows=bottom - top + 1, number_of_columns=right - left + 1)
+        if bl.number_of_rows * bl.number_of_columns <= len(self.dict):
+            for row in range(top, bottom + 1):
+                for column in range(left, right + 1):
+                    if (row, column) in self.dict:
+                        bl.dict[row - top + 1, column - left + 1] = self.dict[row, column]
+        else:
+            for (row, column), value in self.dict.items():
+                if top <= row <= bottom and left <= column <= right:
+                    bl.dict[row - top + 1, column - left + 1] = value
+        return bl
+
+    def regions(self):
+        """
+        finds all rectangular regions of occupied cells (like Excel's current region)
+
+        Returns
+        -------
+        regions : list of tuples (row, column, block)
+            row and column are the position of the upper left cell of the region in this block
+
+            block contains the values of the region
+
+            the regions are sorted by row, then column
+
+        Note
+        ----
+        Cells that touch each other (also diagonally) belong to the same region.
+        """
+        return [(top, left, self._sub_block(top, left, bottom, right)) for top, left, bottom, right in self._region_bounds()]
+
+    def current_region(self, row, column):
+        """
+        finds the rectangular region of occupied cells that contains the given cell (like Excel's current region)
+
+        Parameters
+        ----------
+        row : int
+            row of the cell
+
+        column : int
+            column of the cell
+
+        Returns
+        -------
+        region : tuple (row, column, block)
+            row and column are the position of the upper left cell of the region in this block
+
+            block contains the values of the region
+
+            if the cell is not part of any region, a 1x1 empty block at the given cell is returned
+        """
+        self._check_row(row, "row")
+        self._check_column(column, "column")
+        # only the components in the rows of (the rectangles of) the components found so far are flood filled,
+        # as a region has at least one occupied cell in each of its rows
+        columns_per_row = collections.defaultdict(list)
+        for cell_row, cell_column in self.dict:
+            columns_per_row[cell_row].append(cell_column)
+        seen = set()
+        scanned_rows = set()
+        rows_to_scan = [row]
+        rectangles = []
+        while rows_to_scan:
+            scan_row = rows_to_scan.pop()
+            if scan_row in scanned_rows:
+                continue
+            scanned_rows.add(scan_row)
+            for scan_column in columns_per_row.get(scan_row, ()):
+                if (scan_row, scan_column) not in seen:
+                    seen.add((scan_row, scan_column))
+                    top, left, bottom, right = self._component_bounds(scan_row, scan_column, (scan_row, scan_column, scan_row, scan_column), seen)
+                    rectangles.append((top, left, bottom, right))
+                    rows_to_scan.extend(range(top - 1, bottom + 2))
+        for top, left, bottom, right in self._merge_rectangles(rectangles):
+            if top <= row <= bottom and left <= column <= right:
+                return (top, left, self._sub_block(top, left, bottom, right))
+        return (row, column, block(number_of_rows=1, number_of_columns=1))
+
     def vlookup(self, s, *, row_from=1, row_to=missing, column1=1, column2=missing, default=missing):
         """
         searches in column1 for row between row_from and row_to for s and returns the value found at (that row, column2)
@@ -590,10 +1184,18 @@ class block:
         """
         return self.vlookup(s, row_from=row_from, row_to=row_to, column1=column1, column2=column2, default=default)
 
-    def decode_to_files(self):
+    def decode_to_files(self, directory=".", pattern="*"):
         """
         decode the block with encoded file(s) to individual pyoidide file(s)
 
+        Parameters
+        ----------
+        directory : str or Pathlib.Path
+            directory to write the file(s) to (default: current directory)
+
+        pattern : str
+            only files with a name that matches this (fnmatch) pattern will be decoded (default: "*", so all files)
+
         Returns
         -------
         count : int
@@ -602,28 +1204,60 @@ class block:
         Note
         ----
         if the block does not contain an encode file, the method just returns 0
+
+        Note
+        ----
+        Each file is decoded chunk by chunk, into a temporary file in the same directory, which is renamed to
+        the output file only when decoding is complete.
+
+        Compressed files (see encode_file) are decompressed and their checksum is verified.
+        If the checksum does not match (or the end of the file is missing), a ValueError will be raised and
+        the output file is not written.
+
+        Encoded folders (see encode_folder) are extracted into directory. In that case, all files in the archive are counted.
+
+        Note
+        ----
+        Files are always written into directory: an encoded file with an absolute path is written as its name only.
+        If the path of an encoded file contains .., a ValueError will be raised.
         """
+        headers = sorted((column, row) for (row, column), value in self.dict.items() if _parse_file_header(value))
         count = 0
-        for column in range(1, self.number_of_columns + 1):
-            row = 1
-            bl = self.minimized()
-            while row <= self.number_of_rows:
-                if self[row, column] and self[row, column].startswith("<file=") and self[row, column].endswith(">"):
-                    filename = self[row, column][6:-1]
-                    collect = []
-                    row += 1
-                    while bl[row, column] != "</file>":
-                        if bl[row, column]:
-                            collect.append(bl[row, column])
-                        row += 1
-                    decoded = base64.b64decode("".join(collect))
-                    open(filename, "wb").write(decoded)
-                    count += 1
-                row += 1
+        for column, row in headers:
+            filename, parameters = _parse_file_header(self.dict[row, column])
+            if not fnmatch.fnmatch(filename, pattern):
+                continue
+            if parameters.get("archive") == "zip":
+                with tempfile.TemporaryFile() as f:
+                    self._decode_file(row, column, filename, parameters, f)
+                    f.seek(0)
+                    with zipfile.ZipFile(f) as zf:
+                        zf.extractall(directory)
+                        count += sum(not info.is_dir() for info in zf.infolist())
+            else:
+                path = _decode_path(directory, filename)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                with _replacing_file(path) as f:  # so a file that fails to decode doesn't end up on disk
+                    self._decode_file(row, column, filename, parameters, f)
+                count += 1
         return count
 
+    def _decode_file(self, row, column, filename, parameters, f):
+        number_of_columns = int(parameters.get("columns", 1))
+        decoder = _Decoder(f, compression=parameters.get("z"), sha256=parameters.get("sha256"), name=filename)
+        for row in range(row + 1, self.highest_used_row_number + 1):
+            if self.dict.get((row, column)) == "</file>":
+                break
+            for this_column in range(column, column + number_of_columns):  # row-major
+                chunk = self.dict.get((row, this_column))
+                if chunk:
+                    decoder.write(chunk)
+        else:
+            raise ValueError(f"no </file> found for {filename}")
+        decoder.close()
+
     @classmethod
-    def encode_file(cls, file):
+    def encode_file(cls, file, compression=None, number_of_columns=1, chunk_size=5000):
         """
         make a block with the given pyodide file encoded
 
@@ -632,93 +1266,584 @@ class block:
         file : file name (str)
             file to be encoded
 
+        compression : str
+            if None (default), the file is not compressed
+
+            if "deflate" or "lzma", the file is compressed with zlib or lzma, before encoding.
+            The header will then be like <file=name;z=deflate;sha256=...>, which is not supported by the VBA decoder
+
+        number_of_columns : int
+            number of columns to spread the encoded chunks over (row-major) (default 1)
+
+            if > 1, the header will be like <file=name;columns=4>, which is not supported by the VBA decoder
+
+        chunk_size : int
+            number of characters per cell (default 5000)
+
+            should be a multiple of 4 and not more than 32764 (Excel's limit is 32767 characters per cell)
+
         Returns
         -------
         block with encoded file : block (minimized)
+
+        Note
+        ----
+        The file is read and encoded in chunks, so the time needed is proportional to the file size.
         """
 
-        bl = cls(number_of_rows=100000, number_of_columns=1)
+        def feed(encoder):
+            with open(file, "rb") as f:
+                while data := f.read(encoder.read_size):
+                    encoder.write(data)
 
-        n = 5000  # block size
-        row = 1
-        bl[row, 1] = f"<file={file}>"
-        row += 1
-        b64 = base64.b64encode(open(file, "rb").read()).decode("utf-8")
-        while b64:
-            b64_n = b64[:n]
-            bl[row, 1] = b64_n
-            row += 1
-            b64 = b64[n:]
-        bl[row, 1] = f"</file>"
-        row += 1
-        return bl.minimized()
+        return _encode(file, feed, compression=compression, number_of_columns=number_of_columns, chunk_size=chunk_size)
 
+    @classmethod
+    def encode_folder(cls, path, pattern="*", number_of_columns=1, chunk_size=5000):
+        """
+        make a block with all files in the given pyodide folder encoded as one zip archive
 
-class Capture:
+        Parameters
+        ----------
+        path : str or Pathlib.Path
+            folder to be encoded (including all subfolders)
+
+        pattern : str
+            only files with a name that matches this (glob) pattern will be included (default: "*", so all files)
+
+        number_of_columns : int
+            number of columns to spread the encoded chunks over (see encode_file)
+
+        chunk_size : int
+            number of characters per cell (see encode_file)
+
+        Returns
+        -------
+        block with encoded folder : block
+
+        Note
+        ----
+        The header will be like <file=name.zip;archive=zip>, where name is the name of the folder.
+        decode_to_files will extract the archive. The VBA decoder will just write the zip file.
+
+        The zip archive is written directly into the block, without an intermediate file.
+        """
+        path = Path(path)
+
+        def feed(encoder):
+            with zipfile.ZipFile(encoder, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+                for entry in sorted(path.rglob(pattern)):
+                    if entry.is_file():
+                        zf.write(entry, arcname=entry.relative_to(path.parent).as_posix())
+
+        return _encode(f"{path.name}.zip", feed, number_of_columns=number_of_columns, chunk_size=chunk_size, archive="zip")
+
+
+def _encode(filename, feed, compression=None, number_of_columns=1, chunk_size=5000, archive=None):
+    # makes a block with a header, the encoded data (written to the encoder by feed) and a footer
+    if number_of_columns < 1:
+        raise ValueError(f"number_of_columns should be >=1; not {number_of_columns}")
+    if chunk_size < 4 or chunk_size > 32764 or chunk_size % 4:
+        raise ValueError(f"chunk_size should be a multiple of 4 between 4 and 32764; not {chunk_size}")
+    builder = block_builder(number_of_columns=number_of_columns)
+    builder.append_row([f"<file={filename}>"])
+    encoder = _Encoder(builder, chunk_size=chunk_size, number_of_columns=number_of_columns, compression=compression)
+    feed(encoder)
+    encoder.close()
+    builder.append_row(["</file>"])
+    bl = builder.build()
+    header = filename
+    if compression is not None:
+        header += f";z={compression};sha256={encoder.sha256}"  # the checksum is only known now
+    if number_of_columns > 1:
+        header += f";columns={number_of_columns}"
+    if archive is not None:
+        header += f";archive={archive}"
+    bl[1, 1] = f"<file={header}>"
+    return bl
+
+
+def _decode_path(directory, filename):
+    # returns the path to decode filename to, always within directory
+    path = Path(filename)
+    if path.anchor:
+        path = Path(path.name)
+    if ".." in path.parts:
+        raise ValueError(f"{filename} is outside {directory}")
+    return Path(directory) / path
+
+
+_file_header_keys = ("z", "sha256", "columns", "archive")
+
+
+def _parse_file_header(value):
+    # returns (filename, parameters) if value is a file header, like <file=name> or <file=name;z=deflate;sha256=...>, None otherwise
+    if not (isinstance(value, str) and value.startswith("<file=") and value.endswith(">")):
+        return None
+    parts = value[6:-1].split(";")
+    parameters = {}
+    while len(parts) > 1 and "=" in parts[-1] and parts[-1].partition("=")[0] in _file_header_keys:
+        key, _, parameter = parts.pop().partition("=")
+        parameters[key] = parameter
+    return ";".join(parts), parameters
+
+
+def _compressor(compression):
+    if compression == "deflate":
+        return zlib.compressobj(9)
+    if compression == "lzma":
+        import lzma
+
+        return lzma.LZMACompressor()
+    raise ValueError(f"compression should be None, 'deflate' or 'lzma'; not {compression!r}")
+
+
+def _decompressor(compression):
+    if compression == "deflate":
+        return zlib.decompressobj()
+    if compression == "lzma":
+        import lzma
+
+        return lzma.LZMADecompressor()
+    raise ValueError(f"unsupported compression {compression!r}")
+
+
+class _Encoder:
+    # file like object that base64 encodes everything written to it into rows of a block_builder,
+    # in cells of chunk_size characters, number_of_columns cells per row. Only less than one row is kept in memory.
+    # If compression is given, the data is compressed first and the sha256 checksum of the original data is calculated.
+    def __init__(self, builder, chunk_size=5000, number_of_columns=1, compression=None):
+        self.builder = builder
+        self.chunk_size = chunk_size
+        self.number_of_columns = number_of_columns
+        self._row = []
+        self.chunk_bytes = chunk_size // 4 * 3  # number of bytes that encode to exactly chunk_size characters
+        self.read_size = self.chunk_bytes * 64
+        self._pending = bytearray()
+        if compression is None:
+            self._compressor = None
+        else:
+            self._compressor = _compressor(compression)
+            self._sha256 = hashlib.sha256()
+
+    @property
+    def sha256(self):
+        return self._sha256.hexdigest()
+
+    def write(self, data):
+        if self._compressor is not None:
+            self._sha256.update(data)
+            self._encode(self._compressor.compress(data))
+        else:
+            self._encode(data)
+        return len(data)
+
+    def _encode(self, data):
+        pending = self._pending
+        pending += data
+        if len(pending) >= self.chunk_bytes:
+            number_of_bytes = len(pending) - len(pending) % self.chunk_bytes
+            self._emit(base64.b64encode(pending[:number_of_bytes]).decode("ascii"))
+            del pending[:number_of_bytes]
+
+    def _emit(self, b64):
+        chunk_size = self.chunk_size
+        for i in range(0, len(b64), chunk_size):
+            self._row.append(b64[i : i + chunk_size])
+            if len(self._row) == self.number_of_columns:
+                self.builder.append_row(self._row)
+                self._row = []
+
+    def flush(self): ...
+
+    def close(self):
+        if self._compressor is not None:
+            self._encode(self._compressor.flush())
+        if self._pending:
+            self._emit(base64.b64encode(self._pending).decode("ascii"))
+            self._pending.clear()
+        if self._row:
+            self.builder.append_row(self._row)
+            self._row = []
+
+
+class _Decoder:
+    # decodes base64 chunks (of any length) and writes the result to the file f
+    # If compression is given, the data is decompressed and, if sha256 is given, the checksum is verified on close.
+    def __init__(self, f, compression=None, sha256=None, name=None):
+        self.f = f
+        self.name = getattr(f, "name", "file") if name is None else name
+        self._pending = ""
+        self._decompressor = None if compression is None else _decompressor(compression)
+        self._expected_sha256 = sha256
+        self._sha256 = hashlib.sha256()
+
+    def write(self, b64):
+        if self._pending:
+            b64 = self._pending + b64
+        number_of_characters = len(b64) - len(b64) % 4
+        self._write(base64.b64decode(b64[:number_of_characters]))
+        self._pending = b64[number_of_characters:]
+
+    def _write(self, data):
+        if self._decompressor is not None:
+            data = self._decompressor.decompress(data)
+        if self._expected_sha256 is not None:
+            self._sha256.update(data)
+        self.f.write(data)
+
+    def close(self):
+        if self._pending:
+            self._write(base64.b64decode(self._pending))
+            self._pending = ""
+        if self._decompressor is not None and hasattr(self._decompressor, "flush"):
+            data = self._decompressor.flush()
+            if self._expected_sha256 is not None:
+                self._sha256.update(data)
+            self.f.write(data)
+        if self._expected_sha256 is not None and self._sha256.hexdigest() != self._expected_sha256:
+            raise ValueError(f"checksum error in {self.name}")
+
+
+@contextlib.contextmanager
+def _replacing_file(path):
+    # yields a temporary file (opened for binary writing) in the directory of path, which replaces path when the
+    # with block is left without an exception; otherwise the temporary file is removed and path is left untouched
+    f = tempfile.NamedTemporaryFile(dir=path.parent, prefix=f"{path.name}.", suffix=".tmp", delete=False)
+    try:
+        with f:
+            yield f
+        if path.exists():
+            shutil.copymode(path, f.name)
+        else:  # temporary files are created with mode 0600, so apply the mode of a newly created file
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(f.name, 0o666 & ~umask)
+        os.replace(f.name, path)
+    except BaseException:
+        Path(f.name).unlink(missing_ok=True)
+        raise
+
+
+class block_builder:
     """
-    specifies how to capture stdout
+    builds a block row by row, without the need to know the number of rows in advance
 
     Parameters
     ----------
-    enabled : bool
-        if True (default), all stdout output is captured
+    number_of_columns : int
+        minimum number of columns of the block to build (default 1)
 
-        if False, stdout output is printed
+        if a longer row is appended, the number of columns will grow accordingly
 
-    include_print : bool
-        if False (default), nothing will be printed if enabled is True
+    intern : bool
+        if True, equal values in a column are stored as one shared object (see block)
 
-        if True, output will be printed (and captured if enabled is True)
+        default: False
 
     Note
     ----
     Use this like ::
 
-        capture = xwu.Capture()
+        builder = xwu.block_builder(number_of_columns=2)
+        for ...:
+            builder.append_row([x, y])
+        bl = builder.build()
     """
 
-    _instance = None
+    def __init__(self, number_of_columns=1, intern=False):
+        self._number_of_columns = number_of_columns
+        self._interned = intern
+        self._block = block(number_of_rows=1, number_of_columns=number_of_columns, intern=intern)
+        self.number_of_rows = 0
 
-    def __new__(cls, *args, **kwargs):
-        # singleton
-        if cls._instance is None:
-            cls._instance = super(Capture, cls).__new__(cls)
-        return cls._instance
+    def append_row(self, row):
+        """
+        appends a row to the block under construction
 
-    def __init__(self, enabled=missing, include_print=missing):
-        if hasattr(self, "stdout"):
-            if enabled is not missing:
-                self.enabled = enabled
-            if include_print is not missing:
-                self.include_print = include_print
-            return
-        self.stdout = sys.stdout
-        self._buffer = []
-        self.enabled = True if enabled is missing else enabled
-        self.include_print = False if include_print is missing else include_print
+        Parameters
+        ----------
+        row : scalar or iterable of scalars
+            values for the new row (a scalar is interpreted as a row with one item)
 
-    def __call__(self, enabled=missing, include_print=missing):
-        return self.__class__(enabled, include_print)
+            any iterable (like a list, tuple or generator) is a row, except str and bytes, which are scalars
 
-    def __enter__(self):
-        self.enabled = True
+            None, "" and NaN items are not stored, so an empty row just adds an empty line
+        """
+        if isinstance(row, (str, bytes)) or not isinstance(row, collections.abc.Iterable):
+            row = [row]
+        elif not isinstance(row, (list, tuple)):
+            row = list(row)
+        self.number_of_rows += 1
+        bl = self._block
+        row_number = self.number_of_rows
+        for column, item in enumerate(row, 1):
+            if not _is_empty(item):
+                bl.dict[row_number, column] = bl._intern(column, item) if self._interned else item
+        if len(row) > bl._number_of_columns:
+            bl._number_of_columns = len(row)
+
+    def extend_rows(self, rows):
+        """
+        appends a number of rows to the block under construction
+
+        Parameters
+        ----------
+        rows : iterable of rows (scalar or iterable of scalars, see append_row)
+            rows to be appended
+        """
+        for row in rows:
+            self.append_row(row)
+
+    def build(self):
+        """
+        finalizes the block under construction
+
+        Returns
+        -------
+        block : block
+            the block containing all appended rows (at least one row)
+
+        Note
+        ----
+        The contents is not copied. After build, the builder starts with a new, empty, block.
+        """
+        bl = self._block
+        bl._number_of_rows = max(self.number_of_rows, 1)
+        bl._invalidate_highest_used_cache()
+        self.__init__(number_of_columns=self._number_of_columns, intern=self._interned)
+        return bl
+
+
+class Capture:
+    """
+    specifies how to capture stdout
+
+    Parameters
+    ----------
+    enabled : bool
+        if True (default), all stdout output is captured
+
+        if False, stdout output is printed
+
+    include_print : bool
+        if False (default), nothing will be printed if enabled is True
+
+        if True, output will be printed (and captured if enabled is True)
+
+    max_lines : int
+        if given, only the last max_lines lines are kept
+
+        if None (default), no limit
+
+    max_characters : int
+        if given, only the last lines with a total of at most max_characters characters (including newlines) are kept
+
+        if None (default), no limit
+
+    sink : xlwings.Range or callable
+        if given, new lines are sent to the sink while capturing:
+
+        if a range, the lines are written below each other, starting at the (first cell of the) range
+
+        if a callable, it is called with the new lines as a list of lists (like value)
+
+        if None (default), no sink
+
+    interval : float
+        minimum time (in seconds) between two sends to the sink (default 1)
+
+        upon exiting the context manager, all remaining lines are sent
+
+    Note
+    ----
+    Use this like ::
+
+        capture = xwu.Capture()
+    """
+
+    _instance = None
+    _context_buffer = contextvars.ContextVar("capture_context_buffer", default=None)
+
+    def __new__(cls, *args, **kwargs):
+        # singleton
+        if cls._instance is None:
+            cls._instance = super(Capture, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self, enabled=missing, include_print=missing, max_lines=missing, max_characters=missing, sink=missing, interval=missing):
+        if hasattr(self, "stdout"):
+            if sink is not missing:
+                self.sink = sink
+            if interval is not missing:
+                self.interval = interval
+            if enabled is not missing:
+                self.enabled = enabled
+            if include_print is not missing:
+                self.include_print = include_print
+            if max_lines is not missing:
+                self.max_lines = max_lines
+            if max_characters is not missing:
+                self.max_characters = max_characters
+            self._evict()
+            return
+        self.stdout = sys.stdout
+        self._lines = collections.deque()  # complete lines, without newline
+        self._partial = []  # fragments of the last, not yet completed, line
+        self._number_of_characters = 0  # of all lines in self._lines, including newlines
+        self._line_number = 0  # number of lines completed so far, so the line number of the next line
+        self._new_lines_mark = 0
+        self.sink = None if sink is missing else sink
+        self.interval = 1 if interval is missing else interval
+        self._sink_time = time.perf_counter()
+        self._lock = threading.RLock()
+        self._sink_lock = threading.Lock()
+        self.max_lines = None if max_lines is missing else max_lines
+        self.max_characters = None if max_characters is missing else max_characters
+        self.enabled = True if enabled is missing else enabled
+        self.include_print = False if include_print is missing else include_print
+
+    def __call__(self, enabled=missing, include_print=missing, max_lines=missing, max_characters=missing, sink=missing, interval=missing):
+        return self.__class__(enabled, include_print, max_lines, max_characters, sink, interval)
+
+    def __enter__(self):
+        self.enabled = True
 
     def __exit__(self, exc_type, exc_value, tb):
         self.enabled = False
+        self.send_to_sink(include_partial=True)
+
+    @property
+    def sink(self):
+        return self._sink
+
+    @sink.setter
+    def sink(self, value):
+        self._sink = value
+        self._sink_mark = self._line_number  # only lines captured from now on are sent
+        self._sink_row = 0
+        self._sink_partial = ""  # incomplete last line that has been sent already
+
+    def send_to_sink(self, include_partial=False):
+        """
+        sends all complete lines captured since the previous send to the sink (if any)
+
+        Parameters
+        ----------
+        include_partial : bool
+            if False (default), only complete lines are sent
+
+            if True, an incomplete last line (output without a trailing newline) is sent as well
+            (this is done upon exiting the context manager)
+
+        Note
+        ----
+        If an incomplete line has been sent before, the continuation of that line overwrites it in a range sink,
+        whereas a callable sink gets just the text that was added to it.
+        """
+        if self._sink is None or not self._sink_lock.acquire(blocking=False):  # prevents recursion if the sink prints
+            return
+        try:
+            with self._lock:
+                value = self.value_since(self._sink_mark)
+                continued = bool(self._sink_partial) and len(value) == self._line_number - self._sink_mark  # no lines evicted
+                self._sink_mark = self._line_number
+                partial = "".join(self._partial) if include_partial else ""
+                if partial:
+                    value.append([partial])
+                continued = continued and bool(value) and value[0][0].startswith(self._sink_partial)
+                sent_partial = self._sink_partial
+                if continued and value == [[sent_partial]]:
+                    value = []  # nothing added since the previous send
+                if value:
+                    self._sink_partial = partial
+            self._sink_time = time.perf_counter()
+            if value:
+                if callable(self._sink):
+                    if continued:
+                        value[0] = [value[0][0][len(sent_partial) :]]
+                    self._sink(value)
+                else:
+                    if continued:
+                        self._sink_row -= 1
+                    self._sink.sheet.range((self._sink.row + self._sink_row, self._sink.column)).value = value
+                    self._sink_row += len(value)
+        finally:
+            self._sink_lock.release()
 
     def write(self, data):
-        self._buffer.append(data)
+        buffer = self._context_buffer.get()
+        if buffer is None:
+            self._store(data)
+        else:
+            buffer.append(data)  # private to this thread or task, so no locking required
         if self._include_print:
             self.stdout.write(data)
 
+    def _store(self, data):
+        if "\n" in data:
+            with self._lock:
+                lines = data.split("\n")
+                if self._partial:
+                    self._partial.append(lines[0])
+                    lines[0] = "".join(self._partial)
+                last = lines.pop()
+                self._partial = [last] if last else []
+                self._lines.extend(lines)
+                self._number_of_characters += sum(map(len, lines)) + len(lines)
+                self._line_number += len(lines)
+                self._evict()
+            if self._sink is not None and time.perf_counter() - self._sink_time >= self.interval:
+                self.send_to_sink()
+        elif data:
+            with self._lock:
+                self._partial.append(data)
+
+    @contextlib.contextmanager
+    def context(self):
+        """
+        context manager that captures the output of the current thread or asyncio task in a private buffer
+
+        Note
+        ----
+        Use this like ::
+
+            def process_row(row):
+                with capture.context():
+                    print(...)
+
+        Upon exit, the output is added to the capture buffer (or to the enclosing context) in one go.
+        So, output of threads or tasks doesn't interleave and no locking is required while printing.
+        """
+        buffer = []
+        token = self._context_buffer.set(buffer)
+        try:
+            yield
+        finally:
+            self._context_buffer.reset(token)
+            data = "".join(buffer)
+            parent_buffer = self._context_buffer.get()
+            if parent_buffer is None:
+                self._store(data)
+            else:
+                parent_buffer.append(data)
+
+    def _evict(self):
+        lines = self._lines
+        if self.max_lines is not None:
+            while len(lines) > self.max_lines:
+                self._number_of_characters -= len(lines.popleft()) + 1
+        if self.max_characters is not None:
+            while self._number_of_characters > self.max_characters:
+                self._number_of_characters -= len(lines.popleft()) + 1
+
     def flush(self):
         if self._include_print:
             self.stdout.flush()
-        self._buffer.append("\n")
 
     @property
     def enabled(self):
-        return sys.out == self
+        return sys.stdout == self
 
     @enabled.setter
     def enabled(self, value):
@@ -729,28 +1854,78 @@ class Capture:
 
     @property
     def value(self):
-        result = self.value_keep
-        self.clear()
+        with self._lock:
+            result = self.value_keep
+            self.clear()
         return result
 
     @property
     def value_keep(self):
-        result = [[line] for line in self.str_keep.splitlines()]
+        with self._lock:
+            result = [[line] for line in self._lines]
+            if self._partial:
+                result.append(["".join(self._partial)])
         return result
 
     @property
     def str(self):
-        result = self.str_keep
-        self._buffer.clear()
+        with self._lock:
+            result = self.str_keep
+            self.clear()
         return result
 
     @property
     def str_keep(self):
-        result = "".join(self._buffer)
+        with self._lock:
+            result = "".join(line + "\n" for line in self._lines) + "".join(self._partial)
+        return result
+
+    @property
+    def mark(self):
+        """
+        Returns
+        -------
+        mark that can be used with value_since : int
+        """
+        return self._line_number
+
+    def value_since(self, mark):
+        """
+        returns the complete lines captured since mark (as far as still available)
+
+        Parameters
+        ----------
+        mark : int
+            mark, as returned by the mark property
+
+        Returns
+        -------
+        lines captured since mark : list of lists of str
+        """
+        with self._lock:
+            number_of_lines = min(self._line_number - mark, len(self._lines))
+            if number_of_lines <= 0:
+                return []
+            return [[line] for line in reversed(list(itertools.islice(reversed(self._lines), number_of_lines)))]
+
+    def new_lines(self):
+        """
+        returns the complete lines captured since the previous call of new_lines
+
+        Returns
+        -------
+        new lines : list of str
+        """
+        with self._lock:
+            result = [line for (line,) in self.value_since(self._new_lines_mark)]
+            self._new_lines_mark = self._line_number
         return result
 
     def clear(self):
-        self._buffer.clear()
+        with self._lock:
+            self._lines.clear()
+            self._partial = []
+            self._number_of_characters = 0
 
     @property
     def include_print(self):
@@ -761,6 +1936,100 @@ class Capture:
         self._include_print = value
 
 
+class CaptureHandler(logging.Handler):
+    """
+    logging handler that stores log records, which are only formatted when the output is requested
+
+    Parameters
+    ----------
+    level : int
+        only records with at least this level are stored (default logging.NOTSET, so all records)
+
+    max_records : int
+        if given, only the last max_records records are kept
+
+        if None (default), no limit
+
+    capture : Capture
+        if given, records are formatted when emitted and written to capture (so its max_lines, max_characters and sink apply)
+
+        if None (default), records are stored in the handler and only formatted when the output is requested
+
+    Note
+    ----
+    Use this like ::
+
+        handler = xwu.CaptureHandler(level=logging.INFO)
+        logging.getLogger().addHandler(handler)
+        ...
+        sheet.range(4, 5).value = handler.block.value
+
+    As formatting is deferred, mutable arguments of a log call should not be changed afterwards.
+
+    Exception information is formatted when the record is stored, so the traceback (and its frames) is not kept alive.
+    """
+
+    def __init__(self, level=logging.NOTSET, max_records=None, capture=None):
+        super().__init__(level)
+        self._records = collections.deque(maxlen=max_records)
+        self.capture = capture
+
+    def emit(self, record):
+        if self.capture is not None:
+            self.capture.write(self.format(record) + "\n")
+            return
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = (self.formatter or logging.Formatter()).formatException(record.exc_info)
+            record.exc_info = None
+        self._records.append(record)  # no further formatting here
+
+    @property
+    def records(self):
+        """
+        Returns
+        -------
+        stored log records : list of logging.LogRecord
+        """
+        return list(self._records)
+
+    @property
+    def value(self):
+        result = self.value_keep
+        self.clear()
+        return result
+
+    @property
+    def value_keep(self):
+        return [[line] for line in self.str_keep.splitlines()]
+
+    @property
+    def str(self):
+        result = self.str_keep
+        self.clear()
+        return result
+
+    @property
+    def str_keep(self):
+        return "".join(self.format(record) + "\n" for record in list(self._records))
+
+    @property
+    def block(self):
+        """
+        Returns
+        -------
+        block with a header row and, per record, the timestamp, level, logger name and message : block
+        """
+        builder = block_builder(number_of_columns=4)
+        builder.append_row(["timestamp", "level", "logger", "message"])
+        for record in list(self._records):
+            builder.append_row([datetime.datetime.fromtimestamp(record.created), record.levelname, record.name, record.getMessage()])
+        return builder.build()
+
+    def clear(self):
+        self._records.clear()
+
+
 def trigger_macro(sheet):
     """
     triggers the macro on sheet
@@ -775,25 +2044,479 @@ def trigger_macro(sheet):
     sheet["A1"].value = "=NOW()"
 
 
-def timer(func):
+class _TimerStatistics:
+    # per function timing statistics, with a streaming histogram of log2 spaced buckets (8 per octave) for the percentiles
+    buckets_per_octave = 8
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.self_total = 0
+        self.min = None
+        self.max = None
+        self.histogram = collections.Counter()
+
+    def add(self, duration, self_duration):
+        self.count += 1
+        self.total += duration
+        self.self_total += self_duration
+        if self.min is None or duration < self.min:
+            self.min = duration
+        if self.max is None or duration > self.max:
+            self.max = duration
+        self.histogram[int(math.log2(duration) * self.buckets_per_octave) if duration > 0 else -1] += 1
+
+    def percentile(self, fraction):
+        threshold = fraction * self.count
+        cumulative = 0
+        for bucket in sorted(self.histogram):
+            cumulative += self.histogram[bucket]
+            if cumulative >= threshold:
+                if bucket < 0:
+                    return 0
+                return min(max(2 ** ((bucket + 0.5) / self.buckets_per_octave), self.min), self.max)
+        return self.max
+
+
+_timer_statistics = {}
+_timer_lock = threading.Lock()
+_timer_local = threading.local()
+
+
+def timer(func=None, *, report=True):
     """
     this decorator should be placed after the @xw.script decorator
 
     it will show the name, entry time, exit time and the duration, like
     Done MyScript  11:51:13.24 - 11:51:20.28 (7.04s)
 
+    Parameters
+    ----------
+    report : bool
+        if True (default), show the line above on each call
+
+        if False, the timing is only recorded in the statistics (see timer.stats()), which is much cheaper
+
+    Note
+    ----
+    Can be used as @timer as well as @timer(report=False)
+
+    Note
+    ----
+    All calls are recorded in a global registry, per function.
+    When timed functions are nested, the self time of the outer function excludes the time of the inner timed functions.
     """
+    if func is None:
+        return functools.partial(timer, report=report)
+
+    name = f"{func.__module__}.{func.__qualname__}"
 
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        now0 = datetime.datetime.now()
-        result = func(*args, **kwargs)
-        now1 = datetime.datetime.now()
-        diff = (now1 - now0).total_seconds()
-        print(f"Done {func.__name__}  {now0:%H:%M:%S.}{int(now0.microsecond / 10000):02d} - {now1:%H:%M:%S.}{int(now1.microsecond / 10000):02d} ({diff:.2f}s)")
+        if report:
+            now0 = datetime.datetime.now()
+        stack = getattr(_timer_local, "stack", None)
+        if stack is None:
+            stack = _timer_local.stack = []
+        stack.append(0)  # accumulated duration of nested timed calls
+        t0 = time.perf_counter_ns()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            duration = time.perf_counter_ns() - t0
+            self_duration = duration - stack.pop()
+            if stack:
+                stack[-1] += duration
+            with _timer_lock:
+                if name not in _timer_statistics:
+                    _timer_statistics[name] = _TimerStatistics()
+                _timer_statistics[name].add(duration, self_duration)
+            if Trace._instance is not None and Trace._instance.enabled:
+                Trace._instance._add(name, "timer", t0, duration)
+            if report:
+                now1 = datetime.datetime.now()
+                print(f"Done {func.__name__}  {now0:%H:%M:%S.}{int(now0.microsecond / 10000):02d} - {now1:%H:%M:%S.}{int(now1.microsecond / 10000):02d} ({duration / 1e9:.2f}s)")
+
+    return wrapper
+
+
+def _timer_stats():
+    """
+    returns the timing statistics of all timed functions
+
+    Returns
+    -------
+    block with a header row and per function
+    name, count, total, self, min, max, mean, p50, p95 and p99 (all times in seconds) : block
+
+    Note
+    ----
+    The functions are sorted on descending total time.
+    The percentiles are estimated from a histogram and are accurate to about 5%.
+    """
+    builder = block_builder(number_of_columns=10)
+    builder.append_row(["name", "count", "total", "self", "min", "max", "mean", "p50", "p95", "p99"])
+    with _timer_lock:
+        items = sorted(_timer_statistics.items(), key=lambda item: -item[1].total)
+        for name, statistics in items:
+            builder.append_row(
+                [name, statistics.count]
+                + [
+                    value / 1e9
+                    for value in (
+                        statistics.total,
+                        statistics.self_total,
+                        statistics.min,
+                        statistics.max,
+                        statistics.total / statistics.count,
+                        statistics.percentile(0.5),
+                        statistics.percentile(0.95),
+                        statistics.percentile(0.99),
+                    )
+                ]
+            )
+    return builder.build()
+
+
+def _timer_reset():
+    """
+    clears the timing statistics of all timed functions
+    """
+    with _timer_lock:
+        _timer_statistics.clear()
+
+
+timer.stats = _timer_stats
+timer.reset = _timer_reset
+
+
+_profiling = False
+
+
+def profile(func=None, *, top=20, memory=False):
+    """
+    this decorator runs the function under cProfile (and optionally tracemalloc)
+
+    it should be placed after the @xw.script decorator (and after @timer, if any)
+
+    Parameters
+    ----------
+    top : int
+        number of functions (and allocation sites) to report (default 20)
+
+    memory : bool
+        if False (default), only the time is profiled
+
+        if True, the allocations are traced as well (this slows down the function considerably)
+
+    Note
+    ----
+    Can be used as @profile as well as @profile(top=10, memory=True)
+
+    Note
+    ----
+    After each call, the attribute result of the decorated function contains a block with a header row and the top functions,
+    sorted on descending cumulative time, with the function, number of calls, total time and cumulative time (in seconds).
 
+    If memory is True, this is followed by an empty row, a header row and the top allocation sites,
+    sorted on descending size, with the allocation site, size (in bytes) and number of allocated blocks.
+
+    Note
+    ----
+    If a profiled function calls another profiled function, the inner function is not profiled separately.
+    """
+    if func is None:
+        return functools.partial(profile, top=top, memory=memory)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        global _profiling
+
+        if _profiling:
+            return func(*args, **kwargs)
+
+        import cProfile
+        import pstats
+
+        if memory:
+            import tracemalloc
+
+            started_tracing = not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start()
+            snapshot0 = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+        profiler = cProfile.Profile()
+        _profiling = True
+        try:
+            return profiler.runcall(func, *args, **kwargs)
+        finally:
+            _profiling = False
+            builder = block_builder(number_of_columns=4)
+            builder.append_row(["function", "calls", "total time", "cumulative time"])
+            stats = pstats.Stats(profiler).stats
+            for (filename, line_number, function_name), (_, number_of_calls, total_time, cumulative_time, _) in sorted(
+                stats.items(), key=lambda item: -item[1][3]
+            )[:top]:
+                location = function_name if filename == "~" else f"{function_name} ({Path(filename).name}:{line_number})"
+                builder.append_row([location, number_of_calls, total_time, cumulative_time])
+            if memory:
+                snapshot1 = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+                if started_tracing:
+                    tracemalloc.stop()
+                builder.append_row([])
+                builder.append_row(["allocation site", "size", "count"])
+                statistics = [statistic for statistic in snapshot1.compare_to(snapshot0, "lineno") if statistic.size_diff > 0]
+                for statistic in sorted(statistics, key=lambda statistic: -statistic.size_diff)[:top]:
+                    frame = statistic.traceback[0]
+                    builder.append_row([f"{Path(frame.filename).name}:{frame.lineno}", statistic.size_diff, statistic.count_diff])
+            wrapper.result = builder.build()
+
+    wrapper.result = None
+    return wrapper
+
+
+class Trace:
+    """
+    specifies how to record spans (of the timer decorator and span context managers) for a trace viewer
+
+    Parameters
+    ----------
+    enabled : bool
+        if True (default), spans are recorded
+
+        if False, spans are not recorded
+
+    max_events : int
+        maximum number of events to keep (default 100000)
+
+        if exceeded, the oldest events are discarded
+
+    Note
+    ----
+    Use this like ::
+
+        trace = xwu.Trace()
+        ...
+        trace.write("trace.json")
+
+    The resulting file can be opened in a trace viewer, like https://ui.perfetto.dev or chrome://tracing
+    """
+
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        # singleton
+        if cls._instance is None:
+            cls._instance = super(Trace, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self, enabled=missing, max_events=missing):
+        if hasattr(self, "_events"):
+            if enabled is not missing:
+                self.enabled = enabled
+            if max_events is not missing:
+                self._events = collections.deque(self._events, maxlen=max_events)
+            return
+        self.enabled = True if enabled is missing else enabled
+        self._events = collections.deque(maxlen=100000 if max_events is missing else max_events)
+        self._thread_names = {}
+        self._t0 = time.perf_counter_ns()
+
+    def _add(self, name, category, start, duration):
+        # start and duration in ns (perf_counter_ns)
+        tid = threading.get_ident()
+        if tid not in self._thread_names:
+            self._thread_names[tid] = threading.current_thread().name
+        self._events.append((name, category, start, duration, tid))
+
+    @property
+    def events(self):
+        """
+        Returns
+        -------
+        recorded events in Chrome trace event format : list of dicts
+        """
+        pid = os.getpid()
+        result = [
+            dict(name="thread_name", ph="M", pid=pid, tid=tid, args=dict(name=thread_name)) for tid, thread_name in list(self._thread_names.items())
+        ]
+        for name, category, start, duration, tid in list(self._events):
+            result.append(dict(name=name, cat=category, ph="X", ts=(start - self._t0) / 1000, dur=duration / 1000, pid=pid, tid=tid))
         return result
 
+    @property
+    def json(self):
+        """
+        Returns
+        -------
+        recorded events as Chrome trace event JSON : str
+        """
+        return json.dumps(dict(traceEvents=self.events, displayTimeUnit="ms"))
+
+    def write(self, path, cloud=None):
+        """
+        write the recorded events as Chrome trace event JSON
+
+        Parameters
+        ----------
+        path : str or Pathlib.Path
+            path to write to
+
+        cloud : module
+            if None (default), write to the local file system
+
+            otherwise, use the write function of the given cloud module, like xwu.dropbox
+        """
+        contents = self.json.encode("utf-8")
+        if cloud is None:
+            Path(path).write_bytes(contents)
+        else:
+            cloud.write(path, contents)
+
+    def clear(self):
+        self._events.clear()
+
+
+@contextlib.contextmanager
+def span(name):
+    """
+    context manager that records the time spent in it, if a Trace is enabled
+
+    Parameters
+    ----------
+    name : str
+        name of the span, as shown in the trace viewer
+
+    Note
+    ----
+    Use this like ::
+
+        with xwu.span("read data"):
+            ...
+    """
+    trace = Trace._instance
+    if trace is None or not trace.enabled:
+        yield
+        return
+    t0 = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        trace._add(name, "span", t0, time.perf_counter_ns() - t0)
+
+
+_CacheInfo = collections.namedtuple("CacheInfo", "hits misses maxsize currsize")
+
+
+_memoize_plain_types = (str, int, float, bool, datetime.datetime, datetime.date, datetime.time, datetime.timedelta, type(None))
+
+
+def _memoize_is_plain(value):
+    if isinstance(value, (list, tuple)):
+        return all(_memoize_is_plain(item) for item in value)
+    return isinstance(value, _memoize_plain_types)
+
+
+def _memoize_typed(value):
+    # the value with the type of each item, so True, 1 and 1.0 are different
+    if isinstance(value, (list, tuple)):
+        return (value.__class__.__name__, tuple(_memoize_typed(item) for item in value))
+    return (value.__class__.__name__, value)
+
+
+def _memoize_key(value):
+    # blocks and lists of plain values (like range values) are represented by a sha256 digest of their typed contents,
+    # so the cache doesn't hold a copy of the arguments
+    if isinstance(value, block):
+        return (block, value._digest())  # cached on the block until it changes
+    if isinstance(value, (list, tuple)):
+        if _memoize_is_plain(value):
+            return (value.__class__, hashlib.sha256(repr(_memoize_typed(value)).encode("utf-8")).digest())
+        return (value.__class__, tuple(_memoize_key(item) for item in value))
+    return (value.__class__, value)
+
+
+def memoize(func=None, *, maxsize=128, ttl=None):
+    """
+    this decorator caches the results of a function, based on the values of the arguments
+
+    Parameters
+    ----------
+    maxsize : int
+        maximum number of results to keep (default 128)
+
+        if exceeded, the least recently used result is discarded
+
+        if None, no limit
+
+    ttl : float
+        if given, results are discarded after ttl seconds
+
+        if None (default), results are kept until discarded for maxsize
+
+    Note
+    ----
+    Can be used as @memoize as well as @memoize(maxsize=10, ttl=60)
+
+    Note
+    ----
+    Blocks and (nested) lists and tuples are compared on their contents, so arguments read from an unchanged range
+    give a cache hit. Only a digest of the contents is stored. Values of different types (like True, 1 and 1.0) are different.
+    Cells of blocks are compared on their type and repr. All other arguments should be hashable.
+
+    The digest of a block is computed once and kept until the block is changed, so repeated calls with an unchanged block
+    are cheap. Changes made by writing to block.dict directly are not detected; use block[row, column] = value instead.
+
+    As a cached result is returned as is, it should not be modified.
+
+    Note
+    ----
+    The decorated function has a cache_info() method that returns the number of hits, misses, maxsize and the current size
+    and a cache_clear() method. The undecorated function can be retrieved with undecorated().
+    """
+    if func is None:
+        return functools.partial(memoize, maxsize=maxsize, ttl=ttl)
+
+    cache = collections.OrderedDict()  # key -> (expiry time, result)
+    lock = threading.Lock()
+    hits = misses = 0
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        nonlocal hits, misses
+
+        key = (_memoize_key(args), frozenset((name, _memoize_key(value)) for name, value in kwargs.items()))
+        with lock:
+            if key in cache:
+                expiry, result = cache[key]
+                if expiry is None or time.monotonic() < expiry:
+                    cache.move_to_end(key)
+                    hits += 1
+                    return result
+                del cache[key]
+            misses += 1
+        result = func(*args, **kwargs)
+        with lock:
+            cache[key] = (None if ttl is None else time.monotonic() + ttl, result)
+            cache.move_to_end(key)
+            if maxsize is not None:
+                while len(cache) > maxsize:
+                    cache.popitem(last=False)
+        return result
+
+    def cache_info():
+        with lock:
+            return _CacheInfo(hits, misses, maxsize, len(cache))
+
+    def cache_clear():
+        nonlocal hits, misses
+
+        with lock:
+            cache.clear()
+            hits = misses = 0
+
+    wrapper.cache_info = cache_info
+    wrapper.cache_clear = cache_clear
     return wrapper
 
 
@@ -818,7 +2541,7 @@ def undecorated(func, max_number=1000000):
 
     Note
     ----
-    Only undecorates decoratos which use a __wrapped__ attribute, most likely via @functools.wraps, which is indeed the case for xw.script, and xwu.timer.
+    Only undecorates decoratos which use a __wrapped__ attribute, most likely via @functools.wraps, which is indeed the case for xw.script, xwu.timer, xwu.profile and xwu.memoize.
     """
     for _ in range(max_number):
         if hasattr(func, "__wrapped__"):
@@ -845,6 +2568,172 @@ options = [
 ]
 
 
+_embedded_packages = {}
+_embedded_begin = "# <xlwings_utils embedded packages> (generated, do not edit)"
+_embedded_end = "# </xlwings_utils embedded packages>"
+
+
+def register_embedded(name, payload):
+    """
+    registers a package (or module) embedded in main.py, to be imported with import_embedded
+
+    Parameters
+    ----------
+    name : str
+        name of the package (or module)
+
+    payload : str
+        base64 encoded zip file with the package (or module)
+
+    Note
+    ----
+    This function is called by the code that the CLI (replace --package) puts in main.py and is not to be called directly.
+    """
+    _embedded_packages[name] = payload
+
+
+def import_embedded(name):
+    """
+    imports a package (or module) embedded in main.py with the CLI (replace --package)
+
+    Parameters
+    ----------
+    name : str
+        name of the package (or module)
+
+    Returns
+    -------
+        link to module
+
+    Note
+    ----
+    If the module is already imported, no action
+
+    Note
+    ----
+    The package is unpacked in my_packages, just like with the import_from_folder functions, but without any network access.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    if name not in _embedded_packages:
+        raise ImportError(f"package {name} is not embedded")
+
+    my_packages = Path("my_packages")
+    my_packages.mkdir(parents=True, exist_ok=True)
+    with zipfile.ZipFile(io.BytesIO(base64.b64decode(_embedded_packages[name]))) as zf:
+        zf.extractall(my_packages)
+
+    if str(my_packages) not in sys.path:
+        sys.path = [str(my_packages)] + sys.path
+    return importlib.import_module(name)
+
+
+def _embedded_packages_code(paths):
+    # returns the code block to be put at the start of main.py, with the packages (directories) or modules (.py files) in paths embedded
+    lines = [_embedded_begin, "import xlwings_utils as _xwu", ""]
+    for path in paths:
+        path = Path(path)
+        if not path.exists():
+            raise FileNotFoundError(f"package {path} not found")
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=9) as zf:
+            if path.is_dir():
+                for file in sorted(path.rglob("*")):
+                    if file.is_file() and "__pycache__" not in file.parts and file.suffix != ".pyc":
+                        zf.write(file, file.relative_to(path.parent).as_posix())
+            else:
+                zf.write(path, path.name)
+        payload = base64.b64encode(buffer.getvalue()).decode("ascii")
+        lines.append(f'_xwu.register_embedded("{path.stem if path.is_file() else path.name}", (')
+        lines.extend(f'    "{payload[i : i + 100]}"' for i in range(0, len(payload), 100))
+        lines.append("))")
+    lines.append(_embedded_end)
+    return lines
+
+
+def _embedded_packages_range(lines):
+    # returns the begin and end index of the code block with embedded packages, or None if not present
+    if _embedded_begin not in lines:
+        return None
+    begin = lines.index(_embedded_begin)
+    end = lines.index(_embedded_end, begin) if _embedded_end in lines[begin:] else len(lines) - 1
+    return begin, end + 1
+
+
+def _embedded_packages_block(lines):
+    # returns the code block with embedded packages (if any)
+    begin_end = _embedded_packages_range(lines)
+    return [] if begin_end is None else lines[slice(*begin_end)]
+
+
+def _strip_embedded_packages(lines):
+    # returns lines without the code block with embedded packages (if any)
+    begin_end = _embedded_packages_range(lines)
+    return lines if begin_end is None else lines[: begin_end[0]] + lines[begin_end[1] :]
+
+
+_webextension_name = "xl/webextensions/webextension1.xml"
+_webextension_namespace = "http://schemas.microsoft.com/office/webextensions/webextension/2010/11"
+
+
+def _copy_zip_member(zin, zout, item):
+    # copies the compressed data of item from zin to zout verbatim, so without decompressing and recompressing
+    # zipfile has no public API for this, so this relies on the (private, but long stable) attributes
+    # fp, NameToInfo, start_dir and _didModify of ZipFile and on ZipInfo.FileHeader()
+    zin.fp.seek(item.header_offset)
+    header = zin.fp.read(zipfile.sizeFileHeader)
+    filename_length, extra_length = struct.unpack("<HH", header[26:30])
+    zin.fp.seek(item.header_offset + zipfile.sizeFileHeader + filename_length + extra_length)
+    zinfo = copy.copy(item)
+    zinfo.flag_bits &= ~0x08  # the sizes and CRC are in the local header, so no data descriptor
+    zinfo.header_offset = zout.fp.tell()
+    zout.fp.write(zinfo.FileHeader())
+    remaining = item.compress_size
+    while remaining:
+        chunk = zin.fp.read(min(remaining, 1 << 20))
+        if not chunk:
+            raise zipfile.BadZipFile(f"truncated member {item.filename}")
+        zout.fp.write(chunk)
+        remaining -= len(chunk)
+    zout.filelist.append(zinfo)
+    zout.NameToInfo[zinfo.filename] = zinfo
+    zout.start_dir = zout.fp.tell()
+    zout._didModify = True
+
+
+def _rewrite_zip(file_in, file_out, replacements):
+    """
+    copies a zip file, with some members replaced
+
+    Parameters
+    ----------
+    file_in : str or Pathlib.Path
+        zip file to copy
+
+    file_out : str or Pathlib.Path
+        zip file to write (may be the same as file_in)
+
+    replacements : dict
+        new contents (bytes) per member name
+
+    Note
+    ----
+    All other members are copied verbatim, so without decompressing and recompressing.
+    The output is written to a temporary file in the same directory first, which then replaces file_out.
+    The mode of an existing file_out is kept.
+    """
+    with _replacing_file(Path(file_out).resolve()) as f:
+        with zipfile.ZipFile(file_in, "r") as zin, zipfile.ZipFile(f, "w") as zout:
+            for item in zin.infolist():
+                if item.filename in replacements:
+                    zinfo = zipfile.ZipInfo(item.filename, date_time=item.date_time)
+                    zinfo.compress_type = zipfile.ZIP_DEFLATED
+                    zinfo.external_attr = item.external_attr
+                    zout.writestr(zinfo, replacements[item.filename])
+                else:
+                    _copy_zip_member(zin, zout, item)
+
+
 def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(prog="xlwings_utils.py")
     subparsers = parser.add_subparsers(dest="command", required=True)
@@ -858,6 +2747,9 @@ def build_parser() -> argparse.ArgumentParser:
     p_replace = subparsers.add_parser("replace", help="Replace data into an excel file")
     for option in options:
         p_replace.add_argument(f"--{option.option_name}", f"-{option.short_name}", help=option.help_text, default=None)
+    p_replace.add_argument(
+        "--package", action="append", dest="packages", help="Path to package directory (or module) to embed in the main file (may be repeated)", default=None
+    )
     p_replace.add_argument("excel_in", help="Input excel file")
     p_replace.add_argument("excel_out", help="Output excel file")
 
@@ -865,99 +2757,395 @@ def build_parser() -> argparse.ArgumentParser:
     p_info = subparsers.add_parser("info", help="Show info about an excel file")
     p_info.add_argument("excel_in", help="Input excel file")
 
+    # batch
+    p_batch = subparsers.add_parser("batch", help="Extract, replace or show info for a number of excel files in parallel")
+    batch_subparsers = p_batch.add_subparsers(dest="batch_command", required=True)
+    for batch_command, help_text in (("extract", "Extract data from excel files"), ("replace", "Replace data into excel files"), ("info", "Show info about excel files")):
+        p_batch_command = batch_subparsers.add_parser(batch_command, help=help_text)
+        if batch_command != "info":
+            for option in options:
+                help_text = option.help_text + (" ({stem} is replaced by the name of the excel file without suffix)" if batch_command == "extract" else "")
+                p_batch_command.add_argument(f"--{option.option_name}", f"-{option.short_name}", help=help_text, default=None)
+        if batch_command == "replace":
+            p_batch_command.add_argument(
+                "--package", action="append", dest="packages", help="Path to package directory (or module) to embed in the main file (may be repeated)", default=None
+            )
+            p_batch_command.add_argument("--output-dir", "-o", dest="output_dir", help="Directory to write the excel files to (default: replace in place)", default=None)
+        p_batch_command.add_argument("--manifest", help="File with excel files (or glob patterns) to process, one per line", default=None)
+        p_batch_command.add_argument("--jobs", "-j", type=int, help="Number of processes to use (default: number of CPUs)", default=None)
+        p_batch_command.add_argument("--summary", help="File to write the JSON summary to (default: stdout)", default=None)
+        p_batch_command.add_argument("excel_files", nargs="*", help="Excel files or glob patterns to process")
+
+    # watch
+    p_watch = subparsers.add_parser("watch", help="Replace data into an excel file whenever the given files change")
+    for option in options:
+        p_watch.add_argument(f"--{option.option_name}", f"-{option.short_name}", help=option.help_text, default=None)
+    p_watch.add_argument("--interval", type=float, help="Time between checks for changes, in seconds (default: 0.2)", default=0.2)
+    p_watch.add_argument("--debounce", type=float, help="Time a file should be unchanged before it is replaced, in seconds (default: 0.3)", default=0.3)
+    p_watch.add_argument("excel_in", help="Excel file to update")
+
     return parser
 
 
+def _webextension_root(zin):
+    # returns the parsed webextension of the open zip file zin, or None if not present
+    try:
+        item = zin.getinfo(_webextension_name)
+    except KeyError:
+        return None
+    return etree.fromstring(zin.read(item))
+
+
+def embedded_code(workbook):
+    """
+    returns the xlwings Lite code and settings embedded in a workbook
+
+    Parameters
+    ----------
+    workbook : bytes or str or Pathlib.Path
+        contents of the workbook (e.g. from dropbox.read) or the path to the workbook
+
+    Returns
+    -------
+    contents per property, like main.py, requirements.txt, pyproject.toml and xlwingsSettingsWorkbook : dict
+
+    Note
+    ----
+    Only the part of the workbook that contains the xlwings Lite properties is read and decompressed.
+
+    If the workbook doesn't contain xlwings Lite code, an empty dict is returned.
+    """
+    if isinstance(workbook, (bytes, bytearray, memoryview)):
+        workbook = io.BytesIO(workbook)
+    with zipfile.ZipFile(workbook, "r") as zin:
+        root = _webextension_root(zin)
+    if root is None:
+        return {}
+    ns = {"we": _webextension_namespace}
+    return {prop.get("name"): json.loads(prop.get("value", "")).replace("\r", "") for prop in root.findall(".//we:property", ns)}
+
+
+def _process_workbook(command, excel_in, excel_out=None, filenames=None, packages=None):
+    """
+    extract, replace or show info for one workbook
+
+    Parameters
+    ----------
+    command : str
+        "extract", "replace" or "info"
+
+    excel_in : str or Pathlib.Path
+        workbook to process
+
+    excel_out : str or Pathlib.Path
+        workbook to write (only for replace)
+
+    filenames : dict
+        file name to extract to or replace from, per property (like main.py)
+
+    packages : list
+        directories (packages) or .py files (modules) to embed in main.py (only for replace)
+
+    Returns
+    -------
+    result with the workbook, the command, the status ("ok", "skipped" or "error"),
+    the properties extracted or replaced and the messages : dict
+
+    Note
+    ----
+    No global state is used or changed, so this can be used for several workbooks concurrently.
+    """
+    filenames = dict(filenames or {})
+    result = dict(workbook=str(excel_in), command=command, status="ok", properties=[], messages=[])
+    messages = result["messages"]
+
+    if command in ("info", "extract"):
+        code = embedded_code(excel_in)
+        if not code:
+            result["status"] = "skipped"
+            messages.append(f"no action, because xlwings is not embedded in {excel_in}")
+            return result
+        for prop_name, contents in code.items():
+            match command:
+                case "info":
+                    result["properties"].append(prop_name)
+                    messages.append(prop_name)
+                    for line in contents.splitlines():
+                        messages.append(f"   {line}")
+                case "extract":
+                    if filenames.get(prop_name) is not None:
+                        if prop_name == "main.py":
+                            contents = "\n".join(_strip_embedded_packages(contents.split("\n")))
+                        with open(filenames[prop_name], "w") as f:
+                            f.write(contents)
+                        messages.append(f"written {filenames[prop_name]}")
+                        result["properties"].append(prop_name)
+                        del filenames[prop_name]  # indicates that it has been extracted
+        if command == "extract":
+            for prop_name, filename in filenames.items():
+                if filename is not None:
+                    messages.append(f"{filename} not written, because {prop_name} is not in {excel_in}")
+        return result
+
+    with zipfile.ZipFile(excel_in, "r") as zin:
+        root = _webextension_root(zin)
+    ns = {"we": _webextension_namespace}
+    if root is None or root.find(".//we:property", ns) is None:
+        result["status"] = "skipped"
+        messages.append(f"no action, because xlwings is not embedded in {excel_in}")
+        return result
+
+    for prop in root.findall(".//we:property", ns):
+        prop_name = prop.get("name")
+        if filenames.get(prop_name) is not None:
+            with open(filenames[prop_name], "r") as f:
+                lines = f.read().splitlines()
+            if prop_name == "main.py" and not packages:  # keep the embedded packages, if any
+                old_lines = json.loads(prop.get("value", "")).replace("\r", "").split("\n")
+                lines = _embedded_packages_block(old_lines) + _strip_embedded_packages(lines)
+            prop.set("value", json.dumps("\r\n".join(lines)))
+            result["properties"].append(prop_name)
+            del filenames[prop_name]  # indicates that it has been replaced
+
+    props = root.find(".//we:properties", ns)
+    for prop_name, filename in filenames.items():
+        if filename is not None:
+            with open(filename, "r") as f:
+                lines = f.read().splitlines()
+            etree.SubElement(props, f"{{{ns['we']}}}property", name=prop_name, value=json.dumps("\r\n".join(lines)))
+            result["properties"].append(prop_name)
+
+    if packages:
+        code = _embedded_packages_code(packages)
+        for prop in root.findall(".//we:property", ns):
+            if prop.get("name") == "main.py":
+                lines = _strip_embedded_packages(json.loads(prop.get("value", "")).replace("\r", "").split("\n"))
+                prop.set("value", json.dumps("\r\n".join(code + lines)))
+                break
+        else:
+            etree.SubElement(props, f"{{{ns['we']}}}property", name="main.py", value=json.dumps("\r\n".join(code)))
+        if "main.py" not in result["properties"]:
+            result["properties"].append("main.py")
+        messages.append(f"embedded {', '.join(str(package) for package in packages)}")
+
+    replacements = {_webextension_name: etree.tostring(root, encoding="UTF-8", xml_declaration=True, standalone=True, pretty_print=False)}
+    _rewrite_zip(excel_in, excel_out, replacements)
+    messages.append(f"written {excel_out}")
+    return result
+
+
+def _batch_worker(job):
+    # top level, so it can be used in a process pool
+    try:
+        return _process_workbook(*job)
+    except Exception as e:
+        return dict(workbook=str(job[1]), command=job[0], status="error", properties=[], messages=[f"{e.__class__.__name__}: {e}"])
+
+
+def _batch_workbooks(patterns, manifest=None):
+    # returns the (unique) workbooks that match the patterns and the lines of the manifest, in order
+    if manifest is not None:
+        with open(manifest, "r") as f:
+            patterns = list(patterns) + [line.strip() for line in f if line.strip() and not line.strip().startswith("#")]
+    result = {}
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) if any(char in pattern for char in "*?[") else [pattern]
+        for match in matches:
+            result[match] = None
+    return list(result)
+
+
+def process_batch(args):
+    workbooks = _batch_workbooks(args.excel_files, args.manifest)
+    if not workbooks:
+        print("no excel files specified")
+        sys.exit(0)
+    if args.batch_command in ("replace", "extract") and all(getattr(args, option.option_name, None) is None for option in options) and not getattr(args, "packages", None):
+        option_names = ", ".join(option.option_name for option in options)
+        print(f"no {option_names} specified")
+        sys.exit(0)
+
+    if args.batch_command == "extract" and len(workbooks) > 1:
+        for option in options:
+            filename = getattr(args, option.option_name, None)
+            if filename is not None and "{stem}" not in filename:
+                print(f"{option.option_name} {filename} should contain {{stem}}, as otherwise all excel files are extracted to the same file")
+                sys.exit(1)
+
+    jobs = []
+    for workbook in workbooks:
+        path = Path(workbook)
+        filenames = {}
+        for option in options:
+            filename = getattr(args, option.option_name, None)
+            if filename is not None:
+                filenames[option.prop_name] = filename.replace("{stem}", path.stem) if args.batch_command == "extract" else filename
+        excel_out = None
+        if args.batch_command == "replace":
+            excel_out = workbook if args.output_dir is None else str(Path(args.output_dir) / path.name)
+        jobs.append((args.batch_command, workbook, excel_out, filenames, getattr(args, "packages", None)))
+
+    # workbooks with the same name (from different folders) would overwrite each other's output
+    written_by = {}
+    for command, workbook, excel_out, filenames, packages in jobs:
+        outputs = [excel_out] if command == "replace" else filenames.values() if command == "extract" else []
+        for output in outputs:
+            if output is not None:
+                key = os.path.normcase(os.path.abspath(output))
+                if key in written_by and written_by[key] != workbook:
+                    print(f"{written_by[key]} and {workbook} would both be written to {output}")
+                    sys.exit(1)
+                written_by[key] = workbook
+
+    if getattr(args, "output_dir", None) is not None:
+        Path(args.output_dir).mkdir(parents=True, exist_ok=True)
+    if args.jobs == 1 or len(jobs) == 1:
+        results = [_batch_worker(job) for job in jobs]
+    else:
+        import concurrent.futures
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            results = list(executor.map(_batch_worker, jobs))
+
+    summary = dict(
+        command=args.batch_command,
+        ok=sum(result["status"] == "ok" for result in results),
+        skipped=sum(result["status"] == "skipped" for result in results),
+        errors=sum(result["status"] == "error" for result in results),
+        workbooks=results,
+    )
+    if args.summary is None:
+        print(json.dumps(summary, indent=2))
+    else:
+        with open(args.summary, "w") as f:
+            json.dump(summary, f, indent=2)
+    return summary
+
+
+def _file_signature(filename):
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _watch(excel_in, filenames, interval=0.2, debounce=0.3, stop=None):
+    """
+    replaces properties of a workbook whenever the corresponding files change
+
+    Parameters
+    ----------
+    excel_in : str or Pathlib.Path
+        workbook to update (in place)
+
+    filenames : dict
+        file name to replace from, per property (like main.py)
+
+    interval : float
+        time between checks for changes, in seconds
+
+    debounce : float
+        time a file should be unchanged before it is replaced, in seconds
+
+    stop : threading.Event
+        if given, watching stops when set
+
+        if None (default), watching continues until interrupted
+
+    Note
+    ----
+    Only properties of which the contents differ from the contents in the workbook are replaced.
+    """
+    stop = threading.Event() if stop is None else stop
+    filenames = {prop_name: filename for prop_name, filename in filenames.items() if filename is not None}
+    injected = embedded_code(excel_in)  # contents currently in the workbook, per property
+    if "main.py" in injected:
+        injected["main.py"] = "\n".join(_strip_embedded_packages(injected["main.py"].split("\n")))
+    signatures = {prop_name: None for prop_name in filenames}  # None forces a check at start
+    changed_at = {}  # time of the last change of files that are not yet replaced, per property
+    while True:
+        now = time.monotonic()
+        for prop_name, filename in filenames.items():
+            signature = _file_signature(filename)
+            if signature != signatures[prop_name]:
+                signatures[prop_name] = signature
+                if signature is not None:
+                    changed_at[prop_name] = now
+        ready = [prop_name for prop_name, t in changed_at.items() if now - t >= debounce]
+        if ready:
+            changed = {}
+            for prop_name in ready:
+                try:
+                    with open(filenames[prop_name], "r") as f:
+                        contents = "\n".join(f.read().splitlines())
+                except OSError:
+                    continue
+                if contents != injected.get(prop_name):
+                    changed[prop_name] = filenames[prop_name]
+            if changed:
+                t0 = time.perf_counter()
+                try:
+                    result = _process_workbook("replace", excel_in, excel_in, changed)
+                except OSError as e:
+                    print(f"{excel_in} could not be updated ({e}); retrying")
+                else:
+                    if result["status"] != "ok":
+                        print("\n".join(result["messages"]))
+                        return
+                    injected = embedded_code(excel_in)
+                    if "main.py" in injected:
+                        injected["main.py"] = "\n".join(_strip_embedded_packages(injected["main.py"].split("\n")))
+                    for prop_name in ready:
+                        del changed_at[prop_name]
+                    print(f"replaced {', '.join(changed.values())} in {excel_in} ({time.perf_counter() - t0:.3f}s)")
+            else:
+                for prop_name in ready:
+                    del changed_at[prop_name]
+        if stop.wait(interval):
+            return
+
+
 def process(args):
-    for option in options:
-        option.filename = getattr(args, option.option_name, None)
+    if args.command == "batch":
+        return process_batch(args)
+
+    if args.command == "watch":
+        filenames = {option.prop_name: getattr(args, option.option_name, None) for option in options}
+        if all(filename is None for filename in filenames.values()):
+            option_names = ", ".join(option.option_name for option in options)
+            print(f"no {option_names} specified")
+            sys.exit(0)
+        print(f"watching {', '.join(filename for filename in filenames.values() if filename is not None)} (press Ctrl-C to stop)")
+        try:
+            _watch(args.excel_in, filenames, interval=args.interval, debounce=args.debounce)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    filenames = {option.prop_name: getattr(args, option.option_name, None) for option in options}
+    packages = getattr(args, "packages", None)
 
     if args.command in ("replace", "extract"):
-        if all(option.filename is None for option in options):
+        if all(filename is None for filename in filenames.values()) and not packages:
             option_names = ", ".join(option.option_name for option in options)
             print(f"no {option_names} specified")
             sys.exit(0)
     if args.command == "replace" and args.excel_out == "*":
         args.excel_out = args.excel_in
 
-    found = set()
-    if args.command == "replace":
-        zip_buffer = io.BytesIO()
-        zf = zipfile.ZipFile(zip_buffer, mode="w", compression=zipfile.ZIP_DEFLATED)
-    xlwings_embedded = False
-    with zipfile.ZipFile(args.excel_in, "r") as zin:
-        for item in zin.infolist():
-            item_contents = zin.read(item.filename)
-            if item.filename == "xl/webextensions/webextension1.xml":
-                root = etree.fromstring(item_contents)
-                ns_map = "http://schemas.microsoft.com/office/webextensions/webextension/2010/11"
-                ns = {"we": ns_map}
-
-                for prop in root.findall(".//we:property", ns):
-                    xlwings_embedded = True
-                    prop_name = prop.get("name")
-                    found.add(prop_name)
-                    value = prop.get("value", "")
-                    contents = json.loads(value).replace("\r", "")
-
-                    match args.command:
-                        case "info":
-                            print(prop_name)
-                            for line in contents.splitlines():
-                                print(f"   {line}")
-                        case "extract":
-                            for option in options:
-                                if option.prop_name == prop_name:
-                                    if option.filename is not None:
-                                        with open(option.filename, "w") as f:
-                                            f.write(contents)
-                                        print(f"written {option.filename}")
-                                        option.filename = None  # indicates that it has been extracted
-                        case "replace":
-                            for option in options:
-                                if option.prop_name == prop_name:
-                                    if option.filename is not None:
-                                        with open(option.filename, "r") as f:
-                                            lines = f.read().splitlines()
-                                            new_contents = json.dumps("\r\n".join(lines))
-                                            prop.set("value", new_contents)
-                                        option.filename = None  # indicates that it has been replaced
-
-                if args.command == "extract":
-                    for option in options:
-                        if option.filename is not None:
-                            print(f"{option.filename} not written, because {option.prop_name} is not in {args.excel_in}")
-
-                if args.command == "replace":
-                    for option in options:
-                        if option.filename is not None:
-                            with open(option.filename, "r") as f:
-                                lines = f.read().splitlines()
-                                contents = json.dumps("\r\n".join(lines))
-                            props = root.find(".//we:properties", ns)
-                            etree.SubElement(props, f"{{{ns['we']}}}property", name=option.prop_name, value=contents)
-
-                    item_contents = etree.tostring(root, encoding="UTF-8", xml_declaration=True, standalone=True, pretty_print=False)
-
-            if args.command == "replace":
-                zf.writestr(item, item_contents)
-
-    if not xlwings_embedded:
-        print(f"no action, because xlwings is not embedded in {args.excel_in}")
-        return
-
-    if args.command == "replace":
-        zf.close()
-        zip_buffer.seek(0)
-        with open(args.excel_out, "wb") as f:
-            f.write(zip_buffer.read())
-        print(f"written {args.excel_out}")
+    result = _process_workbook(args.command, args.excel_in, getattr(args, "excel_out", None), filenames, packages)
+    for message in result["messages"]:
+        print(message)
+    return result
 
 
 def main(argv=None) -> int:
     parser = build_parser()
     args = parser.parse_args(argv)
-    process(args)
+    result = process(args)
+    if args.command == "batch":
+        return 1 if result["errors"] else 0
     print("done")
 
 